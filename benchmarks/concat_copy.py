@@ -0,0 +1,106 @@
+"""
+Time the ways `concat` can copy a source into its output: copy_file_range(),
+sendfile(), read()/write() and shutil.copyfileobj() used before.
+
+Usage: python benchmarks/concat_copy.py [--files 4] [--size 100] [--repeat 3]
+                                        [--dir DIR]
+
+Sources are `--size` megabytes of random data each, created in `--dir`,
+which should be on the filesystem of the build directory.
+"""
+import argparse
+import os
+import shutil
+from tempfile import mkdtemp
+from time import time
+
+
+def _load_file_utils():
+    # without importing pybuildtool, which needs waf
+    from importlib.util import module_from_spec, spec_from_file_location
+    spec = spec_from_file_location('file_utils', os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), os.pardir,
+            'pybuildtool', 'misc', 'file_utils.py'))
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# pylint:disable=protected-access
+file_utils = _load_file_utils()
+
+
+def copy_with(copy_chunk):
+    def copy(src, dest):
+        while copy_chunk(src.fileno(), dest.fileno()):
+            pass
+    return copy
+
+
+def copyfileobj(src, dest):
+    shutil.copyfileobj(src, dest)
+
+
+def get_methods():
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(('copy_file_range',
+                copy_with(file_utils._copy_file_range_chunk)))
+    if hasattr(os, 'sendfile'):
+        methods.append(('sendfile', copy_with(file_utils._sendfile_chunk)))
+    methods.append(('read/write', copy_with(file_utils._read_write_chunk)))
+    methods.append(('copyfileobj', copyfileobj))
+    return methods
+
+
+def concat(sources, output, copy):
+    with open(output, 'wb') as dest:
+        for source in sources:
+            with open(source, 'rb') as src:
+                copy(src, dest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+            '\n')[0])
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--size', type=int, default=100,
+            help='megabytes of every source')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dir', default=None)
+    options = parser.parse_args()
+
+    workdir = mkdtemp(dir=options.dir)
+    try:
+        sources = []
+        for index in range(options.files):
+            source = os.path.join(workdir, 'source%i' % index)
+            with open(source, 'wb') as f:
+                for _ in range(options.size):
+                    f.write(os.urandom(1024 * 1024))
+            sources.append(source)
+
+        expected = None
+        output = os.path.join(workdir, 'output')
+        print('%i x %iMB sources, best of %i' % (options.files,
+                options.size, options.repeat))
+        for name, copy in get_methods():
+            timings = []
+            for _ in range(options.repeat):
+                if os.path.exists(output):
+                    os.remove(output)
+                started_at = time()
+                concat(sources, output, copy)
+                timings.append(time() - started_at)
+
+            digest = file_utils.file_hash(output)
+            if expected is None:
+                expected = digest
+            print('%-16s %.3fs%s' % (name, min(timings),
+                    '' if digest == expected else '  OUTPUT DIFFERS'))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
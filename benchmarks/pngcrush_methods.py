@@ -0,0 +1,104 @@
+"""
+Compare crushing images with the method learned by brute-force, like the
+`pngcrush` tool does with `learn`, against brute-force every time.
+
+Usage: python benchmarks/pngcrush_methods.py [--neighbours 2] [--brute 148]
+                                             IMAGE_OR_DIRECTORY...
+
+For every image, brute-force finds the best method, then the learned run
+tries only that method and `--neighbours` methods on each side of it. Time
+and size of both are reported for every image and in total.
+
+Requires pngcrush, for example run `apt-get install pngcrush`.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+from tempfile import mkdtemp
+from time import time
+
+# same as the pngcrush tool
+BEST_METHOD_RE = re.compile(r'Best pngcrush method\s*=\s*(\d+)')
+
+
+def find_images(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.png'):
+                    yield os.path.join(dirpath, filename)
+
+
+def crush(executable, args, src, dest):
+    """Returns seconds taken, size of `dest` and the method kept."""
+    started_at = time()
+    output = subprocess.check_output([executable] + args + [src, dest],
+            stderr=subprocess.STDOUT).decode('utf-8', 'replace')
+    duration = time() - started_at
+    match = BEST_METHOD_RE.search(output)
+    return duration, os.path.getsize(dest), match and int(match.group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+            '\n')[0])
+    parser.add_argument('--neighbours', type=int, default=2)
+    parser.add_argument('--brute', type=int, default=148)
+    parser.add_argument('--pngcrush', default='pngcrush')
+    parser.add_argument('paths', nargs='+')
+    options = parser.parse_args()
+
+    executable = shutil.which(options.pngcrush)
+    if executable is None:
+        sys.exit('%s not found' % options.pngcrush)
+
+    workdir = mkdtemp()
+    dest = os.path.join(workdir, 'crushed.png')
+    totals = [0, 0, 0.0, 0, 0.0, 0]
+    try:
+        print('%-40s %9s %9s %9s %9s %9s' % ('image', 'original',
+                'brute', 'seconds', 'learned', 'seconds'))
+        for src in find_images(options.paths):
+            brute_time, brute_size, method = crush(executable,
+                    ['-brute=%i' % options.brute], src, dest)
+            if method is None:
+                print('%-40s no best method reported' % src[-40:])
+                continue
+            methods = [m for m in range(method - options.neighbours,
+                    method + options.neighbours + 1)\
+                    if 1 <= m <= options.brute]
+            args = []
+            for m in methods:
+                args += ['-m', str(m)]
+            learned_time, learned_size, _ = crush(executable, args, src,
+                    dest)
+
+            size = os.path.getsize(src)
+            print('%-40s %9i %9i %9.2f %9i %9.2f' % (src[-40:], size,
+                    brute_size, brute_time, learned_size, learned_time))
+            for index, value in enumerate((1, size, brute_time, brute_size,
+                    learned_time, learned_size)):
+                totals[index] += value
+    finally:
+        shutil.rmtree(workdir)
+
+    images, size, brute_time, brute_size, learned_time, learned_size = totals
+    if not images:
+        return
+    print('%i images, %i bytes: brute-force %i bytes in %.2fs, learned '
+            '%i bytes in %.2fs' % (images, size, brute_size, brute_time,
+            learned_size, learned_time))
+    print('learned method takes %.1f%% of brute-force time, output is '
+            '%.2f%% of brute-force size' % (
+            100.0 * learned_time / max(brute_time, 1e-9),
+            100.0 * learned_size / max(brute_size, 1)))
+
+
+if __name__ == '__main__':
+    main()
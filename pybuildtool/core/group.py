@@ -1,6 +1,7 @@
 import os
+from waflib.Build import CFG_FILES, CleanContext # pylint:disable=import-error
 from waflib.Logs import debug # pylint:disable=import-error
-from .rule import Rule
+from .rule import Rule, bind_token_node, is_token_node, is_token_path
 from ..misc.collections_utils import data_merge
 
 class Group(object):
@@ -63,10 +64,22 @@ class Group(object):
         data_merge(conf, task_class.conf)
 
         self.rule = Rule(self, conf, file_in, file_out, depend_in, extra_out)
+        # outputs declared by the tasks, `extra_out` of the rule is still
+        # read while its tasks are created
+        rule_declared_out = []
         for r in self.rule.rules:
             task = task_class(self.group, conf, env=bld.env)
             task_uid = task._id
 
+            extra_out = list(r.get('extra_out', []))
+            declared_out = task.declare_extra_out(r.get('file_in', []),
+                    r.get('file_out', []))
+            if declared_out:
+                rule_declared_out += declared_out
+                extra_out += declared_out
+
+            # nodes of file_in and file_out, for `file_map`
+            nodes = {}
             for f in r.get('file_in', []):
                 if os.path.isabs(f):
                     if not os.path.exists(f):
@@ -79,9 +92,14 @@ class Group(object):
 
                 debug('%s:%s: %s', 'input', 'file_in', str(node))
                 task.set_inputs(node)
+                nodes[f] = node
 
             for f in r.get('depend_in', []):
-                if os.path.isabs(f):
+                if is_token_path(f, bld):
+                    # tokens of `rule_in` never exist on disk
+                    node = bld.root.make_node(f.lstrip('/'))
+                    bind_token_node(node, bld)
+                elif os.path.isabs(f):
                     if not os.path.exists(f):
                         continue
                     node = bld.root.find_resource(f.lstrip('/'))
@@ -110,8 +128,14 @@ class Group(object):
 
                 debug('%s:%s: %s', 'output', 'file_out', str(node))
                 task.set_outputs(node)
+                nodes[f] = node
 
-            for f in r.get('extra_out', []):
+            # inputs not existing yet were skipped, pairs are kept as
+            # they were declared
+            task.file_map = [(nodes[fi].abspath(), nodes[fo].abspath())\
+                    for (fi, fo) in r.get('file_map', []) if fi in nodes]
+
+            for f in extra_out:
                 if f.startswith(os.path.sep):
                     # create outside files
                     f_dir = os.path.dirname(f)
@@ -124,10 +148,53 @@ class Group(object):
                     node = d_node.make_node(os.path.basename(f))
                 else:
                     node = bld.path.find_or_declare(f)
+                if is_token_node(node):
+                    bind_token_node(node, bld)
                 setattr(node, 'is_virtual_out_' + task_uid, True)
 
                 debug('%s:%s: %s', 'output', 'extra_out', str(node))
                 task.set_outputs(node)
 
             bld.add_to_group(task)
+
+            for path in task.declare_persistent_dirs():
+                declare_persistent_dir(bld, path)
+
+        # referencing this rule includes them too
+        self.rule.extra_out += rule_declared_out
         return self.rule
+
+
+def declare_persistent_dir(bld, path):
+    """Keep directory `path` when running `waf clean`, see
+    keep_persistent_dirs().
+    """
+    try:
+        persistent_dirs = bld._persistent_dirs
+    except AttributeError:
+        persistent_dirs = bld._persistent_dirs = []
+    if path not in persistent_dirs:
+        persistent_dirs.append(path)
+
+
+def keep_persistent_dirs(bld):
+    """Make `waf clean` remove every file of the build directory, except
+    the ones inside directories declared persistent by the tasks.
+    """
+    persistent_dirs = getattr(bld, '_persistent_dirs', None)
+    if not persistent_dirs or not isinstance(bld, CleanContext):
+        return
+
+    # same files waf keeps on its own
+    excl = ['.lock*', '*conf_check_*/**', 'config.log', 'c4che/*']
+    variant_dir = bld.bldnode.abspath()
+    for path in persistent_dirs:
+        path = os.path.relpath(path, variant_dir)
+        if not path.startswith(os.pardir):
+            excl.append(path.replace(os.sep, '/') + '/**')
+
+    cfg_files = set()
+    for env in bld.all_envs.values():
+        cfg_files.update(bld.root.find_or_declare(f) for f in env[CFG_FILES])
+    bld.clean_files = [node for node in bld.bldnode.ant_glob('**/*',
+            excl=excl, quiet=True) if node not in cfg_files]
@@ -0,0 +1,43 @@
+"""
+Run a command and write the peak memory usage of it and of its child
+processes, in megabytes, into a file.
+
+Usage: python peak_memory.py REPORT --shell COMMAND
+       python peak_memory.py REPORT -- ARGUMENT...
+
+Commands of tasks are run by it, see MemoryProbe, the peak of its own
+children belongs to that command only. It is run as a script, without
+importing pybuildtool.
+"""
+import resource
+import subprocess
+import sys
+
+
+def get_children_peak_memory():
+    """Largest resident set size of finished child processes, in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes instead of kilobytes
+        peak //= 1024
+    return peak // 1024
+
+
+def main(argv):
+    report = argv[1]
+    # file descriptors of the jobserver are kept open
+    if argv[2] == '--shell':
+        ret = subprocess.call(argv[3], shell=True, close_fds=False)
+    else:
+        ret = subprocess.call(argv[3:], close_fds=False)
+    with open(report, 'w') as f:
+        f.write(str(get_children_peak_memory()))
+    if ret < 0:
+        # killed by a signal, exit like a shell does
+        ret = 128 - ret
+    return ret
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -3,6 +3,7 @@ import os
 import re
 
 from ..misc.collections_utils import make_list
+from ..misc.key_value_store import get_store
 from ..misc.path import expand_resource
 
 
@@ -11,6 +12,51 @@ def token_to_filename(token_name, bld):
             token_name.replace('/', '__'))
 
 
+def is_token_path(path, bld):
+    return os.path.dirname(path) == os.path.join(bld.variant_dir, '.tokens')
+
+
+def is_token_node(node):
+    return node.parent.name == '.tokens'
+
+
+def _migrate_token_files(store):
+    # tokens used to be stored as one file each inside `.tokens/`, the
+    # directory itself is kept because token nodes are declared inside it
+    token_dir = os.path.join(os.path.dirname(store.filename), '.tokens')
+    if not os.path.isdir(token_dir):
+        return
+    for token_name in os.listdir(token_dir):
+        filename = os.path.join(token_dir, token_name)
+        if not os.path.isfile(filename):
+            continue
+        with open(filename, 'r') as f:
+            store.set(token_name, f.read().strip())
+        os.remove(filename)
+
+
+def get_token_store(bld):
+    return get_store(bld, 'tokens', initialize=_migrate_token_files)
+
+
+def bind_token_node(node, bld):
+    """Make waf read the token's signature from the token store.
+
+    Token nodes never exist on disk, waf asks the node itself whether it
+    exists and what its signature is.
+    """
+    store = get_token_store(bld)
+
+    def exists():
+        return node.name in store
+
+    def get_bld_sig():
+        return md5(store.get(node.name, '').encode()).digest()
+
+    node.exists = exists
+    node.get_bld_sig = get_bld_sig
+
+
 class Rule(object):
 
     def __init__(self, group, config, file_in, file_out, depend_in, extra_out):
@@ -74,6 +120,24 @@ class Rule(object):
         yield token_out
 
 
+    def _directory_file_out(self, fo, fi):
+        # file_out inside directory `fo` for the input `fi`
+        fofi = fi
+        replace_patterns = self.conf.get('replace_patterns', False)
+        if replace_patterns:
+            for (pat, rep) in replace_patterns:
+                fofi = re.sub(pat, rep, fofi)
+        # use basedir to produce file_out
+        basedir = self.conf.get('_source_basedir_', False)
+        if basedir:
+            basedir = expand_resource(self.group, basedir)
+        if basedir and fofi.startswith(basedir):
+            fofi = fofi[len(basedir):].strip('/')
+        else:
+            fofi = os.path.basename(fofi)
+        return os.path.join(fo, fofi)
+
+
     @property
     def files(self):
         # returns the output files after being processes by this tool
@@ -85,19 +149,7 @@ class Rule(object):
             is_dir = fo.endswith(os.path.sep)
             if is_dir:
                 for fi in self.file_in:
-                    fofi = fi
-                    replace_patterns = self.conf.get('replace_patterns', False)
-                    if replace_patterns:
-                        for (pat, rep) in replace_patterns:
-                            fofi = re.sub(pat, rep, fofi)
-                    basedir = self.conf.get('_source_basedir_', False)
-                    if basedir:
-                        basedir = expand_resource(self.group, basedir)
-                    if basedir and fofi.startswith(basedir):
-                        fofi = fofi[len(basedir):].strip('/')
-                    else:
-                        fofi = os.path.basename(fofi)
-                    result.append(os.path.join(fo, fofi))
+                    result.append(self._directory_file_out(fo, fi))
             else:
                 result.append(fo)
         for fo in self.extra_out:
@@ -116,6 +168,20 @@ class Rule(object):
             self.bld.fatal('Cannot use extra_out with multiple file_out')
 
         for fo in self.file_out:
+            is_dir = fo.endswith(os.path.sep)
+            if is_dir and self.conf.get('_source_tree_', False):
+                # one task for the whole directory
+                file_map = [(fi, self._directory_file_out(fo, fi)) for fi\
+                        in self.file_in]
+                result.append({
+                    'file_in': self.file_in,
+                    'file_out': [fofi for (_, fofi) in file_map],
+                    'file_map': file_map,
+                    'depend_in': self.depend_in,
+                    'extra_out': self._extra_plus_token(fo),
+                })
+                continue
+
             if self.conf.get('_source_grouped_', False):
                 result.append({
                     'file_in': self.file_in,
@@ -125,7 +191,6 @@ class Rule(object):
                 })
                 continue
 
-            is_dir = fo.endswith(os.path.sep)
             for fi in self.file_in:
                 if not is_dir:
                     result.append({
@@ -136,21 +201,7 @@ class Rule(object):
                     })
                     continue
 
-                fofi = fi
-                replace_patterns = self.conf.get('replace_patterns', False)
-                if replace_patterns:
-                    for (pat, rep) in replace_patterns:
-                        fofi = re.sub(pat, rep, fofi)
-                # use basedir to produce file_out
-                basedir = self.conf.get('_source_basedir_', False)
-                if basedir:
-                    basedir = expand_resource(self.group, basedir)
-                if basedir and fofi.startswith(basedir):
-                    fofi = fofi[len(basedir):].strip('/')
-                else:
-                    fofi = os.path.basename(fofi)
-
-                fofi = os.path.join(fo, fofi)
+                fofi = self._directory_file_out(fo, fi)
                 result.append({
                     'file_in': [fi],
                     'file_out': [fofi],
@@ -0,0 +1,395 @@
+"""
+Admission control for tasks, waf's `-j` counts every task as one job even if
+the tool forks its own workers.
+
+On posix systems the cpu budget is a GNU make jobserver, shared with child
+processes through `MAKEFLAGS`, so tools like make take their jobs from the
+same budget.
+
+The memory budget, in megabytes, is the physical memory or the value of
+`PYBUILDTOOL_MEMORY_BUDGET` environment variable.
+
+Tasks are started longest critical path first, using their durations in
+previous builds.
+"""
+import errno
+from multiprocessing import cpu_count
+import os
+import re
+from select import select
+import sys
+from tempfile import mkstemp
+from threading import Condition, Lock
+from time import time
+from waflib import Logs # pylint:disable=import-error
+
+from ..misc.key_value_store import get_store
+from .group import declare_persistent_dir
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+try:
+    from shlex import quote
+except ImportError:
+    # python 2
+    from pipes import quote
+
+_budget_lock = Lock()
+
+PEAK_MEMORY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(
+        __file__)), 'peak_memory.py')
+
+
+class TokenBudget(object):
+    """A pool of tokens, tasks wait until they can take all they need."""
+
+    total = None
+    available = None
+
+    def __init__(self, total):
+        self.total = max(1, int(total))
+        self.available = self.total
+        self._condition = Condition()
+
+
+    def acquire(self, count):
+        """Take `count` tokens, returns the number of tokens granted.
+
+        Requests larger than the whole budget are trimmed, such task will
+        have the budget for itself.
+        """
+        count = min(max(1, int(count)), self.total)
+        with self._condition:
+            while self.available < count:
+                self._condition.wait()
+            self.available -= count
+        return count
+
+
+    def release(self, count):
+        with self._condition:
+            self.available += count
+            self._condition.notify_all()
+
+
+class JobServer(object):
+    """GNU make jobserver, one byte in the pipe is one token.
+
+    When the build itself was started by make, we become a client of its
+    jobserver and hold the one implicit token make gave us.
+    """
+
+    total = None
+    read_fd = None
+    write_fd = None
+    fifo = None
+
+    def __init__(self, total, read_fd=None, write_fd=None, fifo=None):
+        self.total = max(1, int(total))
+        self.fifo = fifo
+        # only one task collects tokens at a time, two tasks holding part
+        # of what they need would wait for each other forever
+        self._acquire_lock = Lock()
+        self._held_lock = Lock()
+        self._held = []
+
+        if fifo:
+            self.read_fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+            self.write_fd = os.open(fifo, os.O_WRONLY)
+        elif read_fd is None:
+            self.read_fd, self.write_fd = os.pipe()
+            os.write(self.write_fd, b'+' * self.total)
+        else:
+            self.read_fd, self.write_fd = read_fd, write_fd
+        # a client of make's jobserver, the server owns the pipe
+        self._client = fifo is not None or read_fd is not None
+        self._implicit_free = self._client
+
+
+    @classmethod
+    def from_environ(cls, total, environ=None):
+        """Connect to the jobserver of a parent make, if there is one."""
+        makeflags = (environ or os.environ).get('MAKEFLAGS', '')
+        match = re.search(r'--jobserver-auth=fifo:(\S+)', makeflags)
+        if match:
+            return cls(total, fifo=match.group(1))
+
+        match = re.search(r'--jobserver-(?:auth|fds)=(\d+),(\d+)', makeflags)
+        if match is None:
+            return None
+        read_fd, write_fd = int(match.group(1)), int(match.group(2))
+        try:
+            os.fstat(read_fd)
+            os.fstat(write_fd)
+        except OSError:
+            # make did not pass the pipe, the command was not marked with `+`
+            return None
+        return cls(total, read_fd, write_fd)
+
+
+    def _read_token(self):
+        while True:
+            select([self.read_fd], [], [])
+            try:
+                token = os.read(self.read_fd, 1)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                raise
+            if token:
+                return token
+
+
+    def acquire(self, count):
+        count = min(max(1, int(count)), self.total)
+        with self._acquire_lock:
+            needed = count
+            with self._held_lock:
+                if self._implicit_free:
+                    self._implicit_free = False
+                    needed -= 1
+            for _ in range(needed):
+                token = self._read_token()
+                with self._held_lock:
+                    self._held.append(token)
+        return count
+
+
+    def release(self, count):
+        with self._held_lock:
+            # tokens are interchangeable, it does not matter which task
+            # gives the implicit token back
+            if self._client and not self._implicit_free:
+                self._implicit_free = True
+                count -= 1
+            tokens = b''.join(self._held.pop() for _ in range(count))
+        os.write(self.write_fd, tokens)
+
+
+    def makeflags(self, makeflags=''):
+        """`MAKEFLAGS` for child processes."""
+        makeflags = re.sub(r'\s*--jobserver-(?:auth|fds)=\S+', '', makeflags)
+        makeflags = re.sub(r'(^|\s)-j\d*', '', makeflags)
+        if self.fifo:
+            auth = '--jobserver-auth=fifo:' + self.fifo
+        else:
+            fds = '%i,%i' % (self.read_fd, self.write_fd)
+            auth = '--jobserver-fds=%s --jobserver-auth=%s' % (fds, fds)
+        jobs = '-j%i' % self.total
+        return ' '.join(x for x in (makeflags.strip(), jobs, auth) if x)
+
+
+    def child_kwargs(self, kwargs):
+        """Hand the jobserver to a child process started by waf's
+        `exec_command` with `kwargs`.
+
+        waf 2 runs commands capturing both of their outputs in a pre-forked
+        helper process, which does not have the jobserver's pipe, so these
+        commands are run directly, printing their output as they go.
+        """
+        environ = dict(kwargs.get('env') or os.environ)
+        environ['MAKEFLAGS'] = self.makeflags(environ.get('MAKEFLAGS', ''))
+        kwargs['env'] = environ
+        if not self.fifo:
+            kwargs.setdefault('stdout', None)
+            kwargs.setdefault('stderr', None)
+            if sys.version_info[0] < 3:
+                kwargs['close_fds'] = False
+            else:
+                kwargs['pass_fds'] = tuple(kwargs.get('pass_fds', ())) +\
+                        (self.read_fd, self.write_fd)
+        return kwargs
+
+
+def get_build_jobs(bld):
+    jobs = getattr(bld, 'jobs', None)
+    if not jobs:
+        from waflib import Options # pylint:disable=import-error
+        jobs = getattr(Options.options, 'jobs', None)
+    return jobs or cpu_count()
+
+
+def get_cpu_budget(bld):
+    with _budget_lock:
+        try:
+            return bld._cpu_budget
+        except AttributeError:
+            pass
+
+        jobs = get_build_jobs(bld)
+        if os.name != 'posix':
+            budget = TokenBudget(jobs)
+        else:
+            budget = JobServer.from_environ(jobs) or JobServer(jobs)
+        bld._cpu_budget = budget
+        return budget
+
+
+def get_physical_memory():
+    """Size of physical memory in megabytes, None if unknown."""
+    try:
+        pages = os.sysconf('SC_PHYS_PAGES')
+        page_size = os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return None
+    return pages * page_size // (1024 * 1024)
+
+
+def get_memory_budget(bld):
+    with _budget_lock:
+        try:
+            return bld._memory_budget
+        except AttributeError:
+            pass
+
+        total = os.environ.get('PYBUILDTOOL_MEMORY_BUDGET')
+        if total:
+            total = int(total)
+        else:
+            total = get_physical_memory() or sys.maxsize
+        bld._memory_budget = TokenBudget(total)
+        return bld._memory_budget
+
+
+class MemoryProbe(object):
+    """Peak memory usage of the child processes of one task.
+
+    Every command of the task is run by peak_memory.py, which reports
+    the peak of that command and of its children, whatever other tasks run
+    at the same time. Peaks of commands of the task running at the same time
+    are added up.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # (started_at, finished_at, peak) of every command
+        self._commands = []
+
+
+    def exec_command(self, exec_command, cmd, **kwargs):
+        """Run `cmd` with waf's `exec_command` and measure it."""
+        if resource is None:
+            return exec_command(cmd, **kwargs)
+
+        fd, report = mkstemp(suffix='.mem')
+        os.close(fd)
+        command = [sys.executable, PEAK_MEMORY_SCRIPT, report]
+        if isinstance(cmd, str):
+            command = ' '.join(quote(x) for x in command + ['--shell', cmd])
+        else:
+            command += ['--'] + list(cmd)
+        try:
+            started_at = time()
+            ret = exec_command(command, **kwargs)
+            finished_at = time()
+            with open(report, 'r') as f:
+                peak = int(f.read().strip() or 0)
+        finally:
+            os.remove(report)
+        with self._lock:
+            self._commands.append((started_at, finished_at, peak))
+        return ret
+
+
+    def stop(self):
+        """Megabytes used by the task's children, None if unknown."""
+        with self._lock:
+            commands = list(self._commands)
+        peaks = [sum(peak for (started_at, finished_at, peak) in commands\
+                if started_at <= start < finished_at)\
+                for (start, _, _) in commands]
+        return max(peaks) if peaks else None
+
+
+def get_durations_store(bld):
+    # kept by `waf clean`, the build after it is scheduled from history too
+    dirname = os.path.join(bld.variant_dir, '.durations')
+    declare_persistent_dir(bld, dirname)
+    return get_store(bld, 'durations', dirname=dirname)
+
+
+def record_duration(task):
+    """Keep a running average of the duration of the task's rule."""
+    store = get_durations_store(task.bld)
+    rule_name = task.get_rule_name()
+    previous = store.get(rule_name)
+    if previous is None:
+        duration = task.duration
+    else:
+        duration = (previous + task.duration) / 2.0
+    store.set(rule_name, round(duration, 3))
+
+
+def _get_critical_paths(tasks, consumers):
+    # rules can only use outputs of rules declared before them, so consumers
+    # always come after their producers
+    result = {}
+    for task in reversed(tasks):
+        result[task] = task.predicted_duration + max([0] + [result.get(x, 0)\
+                for x in consumers.get(task, ())])
+    return result
+
+
+def _iter_build_groups(bld):
+    for group in getattr(bld, 'groups', []):
+        indexes = [i for i, x in enumerate(group)\
+                if hasattr(x, 'predicted_duration')]
+        if indexes:
+            yield group, indexes
+
+
+def prioritize_tasks(bld):
+    """Start tasks with the longest critical path first."""
+    tasks = []
+    for group, indexes in _iter_build_groups(bld):
+        tasks += (group[i] for i in indexes)
+
+    store = get_durations_store(bld)
+    producers = {}
+    for task in tasks:
+        task.predicted_duration = store.get(task.get_rule_name(), 0)
+        for node in task.outputs:
+            producers[node] = task
+
+    consumers = {}
+    for task in tasks:
+        for node in task.inputs:
+            producer = producers.get(node)
+            if producer is not None and producer is not task:
+                consumers.setdefault(producer, []).append(task)
+
+    critical_paths = _get_critical_paths(tasks, consumers)
+    for task in tasks:
+        # waf 2 picks tasks with higher weight first
+        task.weight = int(critical_paths[task] * 1000)
+
+    for group, indexes in _iter_build_groups(bld):
+        ordered = sorted((group[i] for i in indexes),
+                key=lambda x: -critical_paths[x])
+        for i, task in zip(indexes, ordered):
+            group[i] = task
+
+    bld._task_consumers = consumers
+    bld.add_post_fun(report_build_time)
+
+
+def report_build_time(bld):
+    tasks = []
+    for group, indexes in _iter_build_groups(bld):
+        tasks += (group[i] for i in indexes if group[i].duration is not None)
+    if not tasks:
+        return
+
+    consumers = getattr(bld, '_task_consumers', {})
+    critical_paths = _get_critical_paths(tasks, consumers)
+    predicted = max(list(critical_paths.values()) +\
+            [sum(x.predicted_duration for x in tasks) / get_build_jobs(bld)])
+    actual = max(x.finished_at for x in tasks) -\
+            min(x.finished_at - x.duration for x in tasks)
+
+    Logs.info('Build time of %i tasks: predicted %.1fs, actual %.1fs' % (
+            len(tasks), predicted, actual))
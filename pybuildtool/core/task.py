@@ -1,11 +1,20 @@
+import json
 import os
 from copy import deepcopy
+from hashlib import sha1
+from multiprocessing import cpu_count
+from tempfile import mkstemp
 from time import time
 from uuid import uuid4
 from waflib.Task import Task as BaseTask # pylint:disable=import-error
 
 from ..misc.collections_utils import make_list
+from ..misc.file_utils import file_hash
+from ..misc.key_value_store import get_store
 from ..misc.path import expand_resource
+from .rule import get_token_store, is_token_node
+from .scheduler import MemoryProbe, get_cpu_budget, get_memory_budget,\
+        record_duration
 
 class Task(BaseTask):
 
@@ -14,11 +23,35 @@ class Task(BaseTask):
     group = None
     file_in = None
     file_out = None
+    # pairs of (file_in, file_out) of `_source_tree_` rules
+    file_map = None
     name = None
     token_in = None
     token_out = None
+    # outputs from declare_extra_out() the tool chose not to write, see
+    # post_run()
+    absent_out = None
+
+    # number of cpu kept busy by the tool, see get_cpu_weight()
+    cpu_weight = 1
+    # commands of the tool take jobs from the build's jobserver, like make
+    jobserver = False
+    # number of cpu granted by the scheduler, available from prepare()
+    cpu_tokens = None
+    # megabytes of memory used by the tool, see get_memory_estimate()
+    memory_estimate = 0
+    memory_tokens = None
+    # seconds, from previous builds and of this build
+    predicted_duration = 0
+    duration = None
+    finished_at = None
 
     _id = None
+    # signatures of inputs saved when the task succeeds, see
+    # get_changed_inputs()
+    _input_state = None
+    # measures commands run by perform(), see exec_command()
+    _memory_probe = None
 
     def __init__(self, group, config, *args, **kwargs):
         super(Task, self).__init__(*args, **kwargs)
@@ -47,8 +80,119 @@ class Task(BaseTask):
         self.group = group
         self.file_in = []
         self.file_out = []
+        self.file_map = []
         self.token_in = []
         self.token_out = []
+        self.absent_out = []
+
+
+    def get_cpu_weight(self):
+        """Number of cpu the tool is going to use.
+
+        Tools forking their own workers should derive it from their
+        configuration with get_parallel_weight(), users can override it with
+        `cpu_weight` option.
+        """
+        return self.conf.get('cpu_weight', self.cpu_weight)
+
+
+    def get_parallel_weight(self, workers=None, items=None):
+        """Number of cpu of a tool running `workers` processes or threads
+        at once, by default one for each processor, but no more than
+        `items`, the number of things it works on.
+
+        `cpu_weight` option overrides it.
+        """
+        c = self.conf.get('cpu_weight')
+        if c is not None:
+            return c
+        if not workers:
+            workers = cpu_count()
+        if items is not None:
+            workers = min(workers, items)
+        return max(1, workers)
+
+
+    def get_memory_estimate(self):
+        """Megabytes of memory the tool is going to use.
+
+        Users can declare it with `memory_estimate` option, otherwise it is
+        the peak memory usage learned from previous builds.
+        """
+        c = self.conf.get('memory_estimate')
+        if c is not None:
+            return int(c)
+        learned = get_store(self.bld, 'memory').get(self.get_rule_name())
+        return learned or self.memory_estimate
+
+
+    def declare_extra_out(self, file_in, file_out):
+        """Files written by the tool besides `file_out`, like files
+        extracted from an archive in `file_in`, or other formats of
+        `file_out`.
+
+        Called before the build, they are added to the rule's `extra_out`.
+        Declared files the tool ends up not writing go in `absent_out`.
+        """
+        return []
+
+
+    def declare_persistent_dirs(self):
+        """Directories the tool keeps its own state in between builds,
+        like incremental analysis results, `waf clean` does not remove
+        them.
+        """
+        return []
+
+
+    def get_state_dir(self, name):
+        """Directory inside the variant's build directory for the tool's
+        own state, one for each rule.
+        """
+        return os.path.join(self.bld.variant_dir, '.' + name,
+                self.get_rule_name().replace('/', '__'))
+
+
+    def get_changed_inputs(self, config=None):
+        """Files of `file_in` changed since the last successful run of the
+        task, or all of them when `config` (by default the task's arguments)
+        or a file in `depend_in` changed.
+
+        Tools of `_source_grouped_` rules can process only these files and
+        treat the others as they were.
+        """
+        # tokens of `rule_in` are not files, waf knows the signature of
+        # every node
+        depend_in = sha1()
+        for node in sorted((node for node in self.inputs\
+                if getattr(node, 'is_virtual_in_' + self._id, False)),
+                key=lambda node: node.abspath()):
+            depend_in.update(node.get_bld_sig())
+        config = sha1(json.dumps([self.args if config is None else config,
+                depend_in.hexdigest()], sort_keys=True,
+                default=str).encode('utf-8')).hexdigest()
+        files = dict((f, file_hash(f)) for f in self.file_in)
+        self._input_state = {'config': config, 'files': files}
+
+        last = get_store(self.bld, 'inputs').get(self._get_inputs_key())
+        if not last or last['config'] != config:
+            return list(self.file_in)
+        return [f for f in self.file_in if last['files'].get(f) != files[f]]
+
+
+    def _get_inputs_key(self):
+        return '%s:%s' % (self.get_rule_name(), ','.join(sorted(
+                os.path.basename(f) for f in self.token_out)))
+
+
+    def get_rule_name(self):
+        return '%s/%s' % (self.group.get_name(), self.name)
+
+
+    def _learn_memory_usage(self, peak):
+        # unknown when the task ran no command, see MemoryProbe
+        if peak:
+            get_store(self.bld, 'memory').set(self.get_rule_name(), peak)
 
 
     def prepare(self):
@@ -69,44 +213,126 @@ class Task(BaseTask):
 
         for node in self.inputs:
             path = node.abspath()
-            if node.parent.name == '.tokens':
+            if is_token_node(node):
                 self.token_in.append(path)
             elif getattr(node, 'is_virtual_in_' + task_uid, False):
                 pass
-            elif path in source_exclude:
-                pass
-            else:
+            elif path not in source_exclude:
                 self.file_in.append(path)
 
         for node in self.outputs:
             path = node.abspath()
-            if node.parent.name == '.tokens':
+            if is_token_node(node):
                 self.token_out.append(path)
             elif getattr(node, 'is_virtual_out_' + task_uid, False):
                 pass
             else:
                 self.file_out.append(path)
 
+        # pairs were declared by Group, see Rule.rules
+        self.file_map = [(fi, fo) for (fi, fo) in self.file_map\
+                if fi not in source_exclude]
+
 
     def finalize_shadow_jutsu(self):
+        store = get_token_store(self.bld)
+        timestamp = str(time())
         for filename in self.token_out:
-            try:
-                os.makedirs(os.path.dirname(filename))
-            except OSError:
-                pass
-            with open(filename, 'w') as f:
-                f.write(str(time()))
+            store.set(os.path.basename(filename), timestamp)
+
+        if self._input_state is not None:
+            get_store(self.bld, 'inputs').set(self._get_inputs_key(),
+                    self._input_state)
+
+
+    def post_run(self):
+        # Tokens live in the token store, not on disk, and `absent_out` was
+        # not written on purpose, hide them from waf's check for missing
+        # output files.
+        outputs = list(self.outputs)
+        hidden = [node for node in outputs if is_token_node(node) or\
+                node.abspath() in self.absent_out]
+        self.outputs[:] = [node for node in outputs if node not in hidden]
+        try:
+            super(Task, self).post_run()
+        finally:
+            self.outputs[:] = outputs
+
+        node_sigs = getattr(self.bld, 'node_sigs', None)
+        if node_sigs is not None:
+            # waf 2
+            for node in hidden:
+                node_sigs[node] = self.uid()
+        else:
+            # waf 1.8 compares the signature of every output
+            signature = self.signature()
+            for node in hidden:
+                node.sig = node.cache_sig = signature
 
 
     def run(self):
         self.prepare_shadow_jutsu()
-        self.prepare()
-        ret = self.perform()
+        cpu_budget = get_cpu_budget(self.bld)
+        memory_budget = get_memory_budget(self.bld)
+        # always in this order, a task holding memory also holds cpu
+        self.cpu_tokens = cpu_budget.acquire(self.get_cpu_weight())
+        try:
+            self.memory_tokens = memory_budget.acquire(
+                    self.get_memory_estimate())
+            try:
+                self.prepare()
+                probe = self._memory_probe = MemoryProbe()
+                started_at = time()
+                try:
+                    ret = self.perform()
+                finally:
+                    peak_memory = probe.stop()
+                self.finished_at = time()
+                self.duration = self.finished_at - started_at
+                self._learn_memory_usage(peak_memory)
+            finally:
+                memory_budget.release(self.memory_tokens)
+        finally:
+            cpu_budget.release(self.cpu_tokens)
         if ret == 0:
             self.finalize_shadow_jutsu()
+            record_duration(self)
         return ret
 
 
+    def exec_command(self, cmd, **kwargs):
+        if self.jobserver:
+            # child processes share the build's jobserver
+            cpu_budget = get_cpu_budget(self.bld)
+            child_kwargs = getattr(cpu_budget, 'child_kwargs', None)
+            if child_kwargs is not None:
+                kwargs = child_kwargs(kwargs)
+        exec_command = super(Task, self).exec_command
+        if self._memory_probe is None:
+            return exec_command(cmd, **kwargs)
+        return self._memory_probe.exec_command(exec_command, cmd, **kwargs)
+
+
+    def exec_command_output(self, cmd, stderr=True, **kwargs):
+        """Run shell command `cmd`, returns its exit code and its output
+        instead of printing it, for tools running commands in parallel.
+
+        Error output is part of it, unless `stderr` is False.
+        """
+        fd, log_filename = mkstemp(suffix='.log')
+        os.close(fd)
+        if stderr:
+            cmd = '%s > %s 2>&1' % (cmd, log_filename)
+        else:
+            cmd = '%s > %s' % (cmd, log_filename)
+        try:
+            ret = self.exec_command(cmd, **kwargs)
+            with open(log_filename, 'r') as f:
+                return ret, f.read()
+        finally:
+            os.remove(log_filename)
+
+
     def _add_arg(self, option, value, sep):
         if sep == ' ':
             self.args.append(option)
@@ -0,0 +1,157 @@
+import errno
+from hashlib import sha1
+import os
+
+# errors telling the kernel cannot copy between these two files
+_UNSUPPORTED_ERRNOS = set(getattr(errno, x) for x in ('EXDEV', 'ENOSYS',
+        'EINVAL', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTSOCK', 'EBADF')\
+        if hasattr(errno, x))
+
+CHUNK_SIZE = 1024 * 1024 * 8
+# ioctl to clone a file on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def _copy_file_range_chunk(src_fd, dest_fd):
+    return os.copy_file_range(src_fd, dest_fd, CHUNK_SIZE) # pylint:disable=no-member
+
+
+def _sendfile_chunk(src_fd, dest_fd):
+    return os.sendfile(dest_fd, src_fd, None, CHUNK_SIZE)
+
+
+def _read_write_chunk(src_fd, dest_fd):
+    data = os.read(src_fd, CHUNK_SIZE)
+    write_all(dest_fd, data)
+    return len(data)
+
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_file_data(src_fd, dest_fd):
+    """Copy from the current position of `src_fd` to its end, into `dest_fd`.
+
+    Data is copied inside the kernel when possible, with copy_file_range()
+    or sendfile(), before falling back to read() and write().
+    Returns number of bytes copied.
+    """
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(_copy_file_range_chunk)
+    if hasattr(os, 'sendfile'):
+        methods.append(_sendfile_chunk)
+    methods.append(_read_write_chunk)
+
+    # only read() is trusted to tell the end of the file, copy_file_range()
+    # and sendfile() also return 0 on files of procfs, sysfs and some FUSE
+    # or overlay filesystems, the next method continues from there
+    total = 0
+    for copy_chunk in methods:
+        try:
+            while True:
+                copied = copy_chunk(src_fd, dest_fd)
+                if copied == 0:
+                    break
+                total += copied
+        except OSError as e:
+            # file positions are kept, the next method continues from there
+            if e.errno not in _UNSUPPORTED_ERRNOS or\
+                    copy_chunk is _read_write_chunk:
+                raise
+    return total
+
+
+def file_hash(filename):
+    digest = sha1()
+    with open(filename, 'rb') as f:
+        for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def files_identical(filename1, filename2):
+    """Compare size and then content hash of two files."""
+    try:
+        stat1 = os.stat(filename1)
+        stat2 = os.stat(filename2)
+    except OSError:
+        return False
+    if (stat1.st_dev, stat1.st_ino) == (stat2.st_dev, stat2.st_ino):
+        return True
+    if stat1.st_size != stat2.st_size:
+        return False
+    return file_hash(filename1) == file_hash(filename2)
+
+
+def _reflink(src_fd, dest_fd):
+    import fcntl # pylint:disable=import-error
+    fcntl.ioctl(dest_fd, FICLONE, src_fd)
+
+
+def copy_file(src, dest, link='copy'):
+    """Copy `src` to `dest`, or link them.
+
+    `link` can be 'copy', 'reflink' (copy-on-write clone, falls back to copy)
+    or 'hardlink' (falls back to copy across filesystems).
+    """
+    if link == 'hardlink':
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        if link == 'reflink':
+            try:
+                _reflink(s.fileno(), d.fileno())
+                return
+            except (ImportError, IOError, OSError):
+                pass
+        copy_file_data(s.fileno(), d.fileno())
+
+
+def copy_files(file_map, link='copy', workers=1):
+    """Copy pairs of (source, destination) using a pool of threads.
+
+    Destinations identical to their source are skipped.
+    Returns lists of copied and skipped pairs, and errors as
+    (source, destination, exception).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def copy_one(src, dest):
+        if files_identical(src, dest):
+            return False
+        dest_dir = os.path.dirname(dest)
+        if not os.path.isdir(dest_dir):
+            try:
+                os.makedirs(dest_dir)
+            except OSError:
+                # created by other thread
+                pass
+        copy_file(src, dest, link)
+        return True
+
+    copied = []
+    skipped = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [(src, dest, executor.submit(copy_one, src, dest))\
+                for (src, dest) in file_map]
+        for (src, dest, future) in futures:
+            try:
+                if future.result():
+                    copied.append((src, dest))
+                else:
+                    skipped.append((src, dest))
+            except (IOError, OSError) as e:
+                errors.append((src, dest, e))
+    return copied, skipped, errors
@@ -0,0 +1,35 @@
+"""
+Read fonts of a family from google font's METADATA.pb or METADATA.json.
+
+Module level functions, so they can be run by a process pool.
+"""
+import json
+
+FONT_FIELDS = ('name', 'style', 'weight', 'fullName', 'postScriptName')
+
+
+def _read_protobuf(data):
+    from google.protobuf import text_format # pylint:disable=import-error,no-name-in-module
+    from pybuildtool.vendor.fonts_public_pb2 import FamilyProto
+
+    message = FamilyProto()
+    text_format.Merge(data, message)
+    for font in message.fonts:
+        yield dict((t[0].json_name, t[1]) for t in font.ListFields())
+
+
+def read_fonts(filename, data=None):
+    """Returns fonts of the family, as dicts of FONT_FIELDS."""
+    if data is None:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    data = data.decode('utf-8')
+
+    if filename.endswith('.json'):
+        fonts = json.loads(data)['fonts']
+    elif filename.endswith('.pb'):
+        fonts = _read_protobuf(data)
+    else:
+        raise ValueError('Unknown file format: ' + filename)
+    return [dict((key, font.get(key)) for key in FONT_FIELDS)\
+            for font in fonts]
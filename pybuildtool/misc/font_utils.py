@@ -0,0 +1,147 @@
+"""
+Convert TrueType/OpenType fonts into web font formats, in process.
+
+`read_sfnt` parses the font once, `sfnt_to_woff` and `sfnt_to_eot` write it
+as WOFF 1.0 (each table zlib compressed) and as Embedded OpenType (the font
+prefixed with an EOT 2.1 header, like ttf2eot does).
+"""
+import struct
+import zlib
+
+
+class FontError(ValueError):
+    pass
+
+
+class Sfnt(object):
+
+    data = None
+    flavor = None
+    # tag: (checksum, table data)
+    tables = None
+
+    def __init__(self, data, flavor, tables):
+        self.data = data
+        self.flavor = flavor
+        self.tables = tables
+
+
+    def table(self, tag):
+        try:
+            return self.tables[tag][1]
+        except KeyError:
+            raise FontError('font has no "%s" table' % tag.decode('ascii'))
+
+
+def read_sfnt(data):
+    if len(data) < 12:
+        raise FontError('not a TrueType/OpenType font')
+    flavor, num_tables = struct.unpack_from('>IH', data, 0)
+    if data[:4] == b'ttcf':
+        raise FontError('font collections are not supported')
+
+    tables = {}
+    for index in range(num_tables):
+        tag, checksum, offset, length = struct.unpack_from('>4sIII', data,
+                12 + 16 * index)
+        if offset + length > len(data):
+            raise FontError('table "%s" is truncated' % tag.decode('ascii',
+                    'replace'))
+        tables[tag] = (checksum, data[offset:offset + length])
+    return Sfnt(data, flavor, tables)
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+def sfnt_to_woff(sfnt, level=9):
+    # tables are compressed only when it makes them smaller
+    tags = sorted(sfnt.tables)
+    entries = []
+    for tag in tags:
+        checksum, table = sfnt.tables[tag]
+        compressed = zlib.compress(table, level)
+        if len(compressed) >= len(table):
+            compressed = table
+        entries.append((tag, checksum, table, compressed))
+
+    header_size = 44
+    offset = header_size + 20 * len(entries)
+    directory = []
+    blocks = []
+    for (tag, checksum, table, compressed) in entries:
+        directory.append(struct.pack('>4sIIII', tag, offset, len(compressed),
+                len(table), checksum))
+        blocks.append(compressed + b'\0' * (_padded(len(compressed)) -\
+                len(compressed)))
+        offset += _padded(len(compressed))
+
+    total_sfnt_size = 12 + 16 * len(entries) + sum(_padded(len(x[2]))\
+            for x in entries)
+    header = struct.pack('>4sIIHHIHHIIIII', b'wOFF', sfnt.flavor, offset,
+            len(entries), 0, total_sfnt_size, 0, 0, 0, 0, 0, 0, 0)
+    return b''.join([header] + directory + blocks)
+
+
+def _name_string(sfnt, name_id):
+    # Windows Unicode names, preferably in US English, in UTF-16BE
+    data = sfnt.table(b'name')
+    _, count, string_offset = struct.unpack_from('>HHH', data, 0)
+    found = b''
+    for index in range(count):
+        (platform_id, encoding_id, language_id, record_name_id, length,
+                offset) = struct.unpack_from('>HHHHHH', data, 6 + 12 * index)
+        if (platform_id, encoding_id, record_name_id) != (3, 1, name_id):
+            continue
+        start = string_offset + offset
+        found = data[start:start + length]
+        if language_id == 0x0409:
+            break
+    return found
+
+
+def _eot_string(value):
+    # size in bytes followed by the string in UTF-16LE
+    value = value[:len(value) & ~1]
+    swapped = bytearray(len(value))
+    swapped[0::2] = value[1::2]
+    swapped[1::2] = value[0::2]
+    return struct.pack('<H', len(swapped)) + bytes(swapped)
+
+
+def sfnt_to_eot(sfnt):
+    os2 = sfnt.table(b'OS/2')
+    head = sfnt.table(b'head')
+    if len(os2) < 78:
+        raise FontError('"OS/2" table is too short')
+
+    weight, fs_type = struct.unpack_from('>H2xH', os2, 4)
+    panose = os2[32:42]
+    unicode_range = struct.unpack_from('>IIII', os2, 42)
+    fs_selection, = struct.unpack_from('>H', os2, 62)
+    if len(os2) >= 86:
+        code_page_range = struct.unpack_from('>II', os2, 78)
+    else:
+        code_page_range = (0, 0)
+    checksum_adjustment, = struct.unpack_from('>I', head, 8)
+
+    fixed = struct.pack('<II', 0x00020001, 0) + panose +\
+            struct.pack('<BBIHH4I2II4IH',
+            1, # DEFAULT_CHARSET
+            fs_selection & 0x01, # italic
+            weight,
+            fs_type,
+            0x504c, # magic number
+            *(unicode_range + code_page_range + (checksum_adjustment,) +\
+            (0, 0, 0, 0, 0)))
+
+    # family, style, version and full name, each after a padding
+    names = b'\0\0'.join(_eot_string(_name_string(sfnt, name_id))\
+            for name_id in (1, 2, 5, 4))
+    # padding and empty root string
+    names += b'\0\0' + struct.pack('<H', 0)
+
+    eot_size = 8 + len(fixed) + len(names) + len(sfnt.data)
+    return b''.join([struct.pack('<II', eot_size, len(sfnt.data)), fixed,
+            names, sfnt.data])
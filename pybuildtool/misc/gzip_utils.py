@@ -0,0 +1,77 @@
+"""
+In process gzip compression with deterministic output.
+
+The gzip header has no file name and no modification time, the same input
+always produces the same bytes. Inputs larger than `block_size` are split
+into blocks compressed in parallel, like pigz, each block is primed with the
+last 32KB of the block before it.
+
+Do not `import gzip` here, waf loads our gzip tool as the `gzip` module.
+"""
+import struct
+import zlib
+
+DEFAULT_BLOCK_SIZE = 128 * 1024
+DICTIONARY_SIZE = 32 * 1024
+# operating system field of the header: unknown
+OS_UNKNOWN = 255
+
+
+def gzip_header(level):
+    if level == 9:
+        extra_flags = 2
+    elif level == 1:
+        extra_flags = 4
+    else:
+        extra_flags = 0
+    # magic, deflate, no flags, no mtime
+    return struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, 0, extra_flags,
+            OS_UNKNOWN)
+
+
+def _compress_block(data, start, end, level):
+    view = memoryview(data)
+    if start:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                8, zlib.Z_DEFAULT_STRATEGY,
+                view[max(0, start - DICTIONARY_SIZE):start].tobytes())
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                8)
+    result = compressor.compress(view[start:end])
+    if end >= len(data):
+        return result + compressor.flush(zlib.Z_FINISH)
+    # ends on a byte boundary, the next block's stream can be appended
+    return result + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def gzip_compress(data, level=9, block_size=DEFAULT_BLOCK_SIZE,
+        executor=None):
+    """Compress `data` into gzip format.
+
+    Blocks are compressed with `executor` (concurrent.futures.Executor) when
+    given, the result does not depend on it.
+    """
+    blocks = [(start, start + block_size, level) for start in range(0,
+            len(data), block_size)] or [(0, 0, level)]
+
+    if executor is None or len(blocks) == 1:
+        parts = [_compress_block(data, *x) for x in blocks]
+    else:
+        parts = list(executor.map(lambda x: _compress_block(data, *x),
+                blocks))
+
+    trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff,
+            len(data) & 0xffffffff)
+    return b''.join([gzip_header(level)] + parts + [trailer])
+
+
+def gzip_file(src, dest, level=9, block_size=DEFAULT_BLOCK_SIZE,
+        executor=None):
+    """Compress file `src` into `dest`, returns sizes of both."""
+    with open(src, 'rb') as f:
+        data = f.read()
+    compressed = gzip_compress(data, level, block_size, executor)
+    with open(dest, 'wb') as f:
+        f.write(compressed)
+    return len(data), len(compressed)
@@ -0,0 +1,85 @@
+"""
+Imports between python files, found with `ast` without importing them.
+"""
+import ast
+import os
+
+
+def get_module_name(filename):
+    """Dotted name of the module, its packages are the directories with
+    __init__.py above it.
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    name = os.path.splitext(basename)[0]
+    parts = [] if name == '__init__' else [name]
+    while os.path.exists(os.path.join(dirname, '__init__.py')):
+        dirname, package = os.path.split(dirname)
+        parts.insert(0, package)
+    return '.'.join(parts)
+
+
+def find_imports(filename, source):
+    """Names of modules, or of objects inside them, imported by the file,
+    relative imports are made absolute.
+    """
+    try:
+        tree = ast.parse(source, filename)
+    except (SyntaxError, ValueError):
+        return []
+
+    module_name = get_module_name(filename)
+    if os.path.basename(filename).startswith('__init__.'):
+        package = module_name
+    else:
+        package = module_name.rpartition('.')[0]
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.split('.') if package else []
+                base = base[:len(base) - (node.level - 1)]
+                if node.module:
+                    base.append(node.module)
+                base = '.'.join(base)
+            else:
+                base = node.module or ''
+            if base:
+                names.add(base)
+            # imported names can be submodules
+            names.update((base + '.' + alias.name).lstrip('.') for alias\
+                    in node.names if alias.name != '*')
+    return sorted(names)
+
+
+def build_import_graph(imports):
+    """Files imported by every file, from {filename: imported names}, only
+    files in `imports` are part of the graph.
+    """
+    modules = dict((get_module_name(f), f) for f in imports)
+    graph = {}
+    for filename, names in imports.items():
+        deps = set()
+        for name in names:
+            # importing a module imports its packages too
+            parts = name.split('.')
+            for index in range(1, len(parts) + 1):
+                dep = modules.get('.'.join(parts[:index]))
+                if dep is not None and dep != filename:
+                    deps.add(dep)
+        graph[filename] = deps
+    return graph
+
+
+def get_import_closure(graph, filename):
+    """Files imported by `filename`, directly or not."""
+    found = set()
+    pending = [filename]
+    while pending:
+        for dep in graph.get(pending.pop(), ()):
+            if dep not in found and dep != filename:
+                found.add(dep)
+                pending.append(dep)
+    return found
@@ -0,0 +1,155 @@
+"""
+Persistent key-value stores kept inside the variant directory.
+
+Each store is a single append-only file, one json encoded `[key, value]`
+record per line, the last record of a key wins. Stores are loaded once per
+build and compacted when the build finishes.
+"""
+import json
+import os
+from threading import Lock
+
+_stores_lock = Lock()
+
+
+class KeyValueStore(object):
+
+    # rewrite the file when it holds this many times more records than keys
+    compact_ratio = 2
+    compact_min_records = 1000
+
+    filename = None
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._data = {}
+        self._lock = Lock()
+        self._file = None
+        self._records = 0
+        self._torn = False
+        self._load()
+
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                line = ''
+                for line in f:
+                    try:
+                        key, value = json.loads(line)
+                    except ValueError:
+                        # partial record from an interrupted build
+                        continue
+                    self._records += 1
+                    if value is None:
+                        self._data.pop(key, None)
+                    else:
+                        self._data[key] = value
+                self._torn = bool(line) and not line.endswith('\n')
+        except IOError:
+            pass
+
+
+    def _append(self, key, value):
+        if self._file is None:
+            dirname = os.path.dirname(self.filename)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            self._file = open(self.filename, 'a')
+            if self._torn:
+                self._file.write('\n')
+                self._torn = False
+        self._file.write(json.dumps([key, value]) + '\n')
+        self._file.flush()
+        self._records += 1
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+
+    def set(self, key, value):
+        with self._lock:
+            if self._data.get(key) == value:
+                return
+            self._data[key] = value
+            self._append(key, value)
+
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self._data:
+                return
+            del self._data[key]
+            self._append(key, None)
+
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            if self._records > self.compact_min_records and\
+                    self._records > self.compact_ratio * len(self._data):
+                self._compact()
+
+
+    def _compact(self):
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            for key, value in self._data.items():
+                f.write(json.dumps([key, value]) + '\n')
+        # os.rename() does not overwrite existing files on windows
+        getattr(os, 'replace', os.rename)(temp_filename, self.filename)
+        self._records = len(self._data)
+
+
+def get_store(bld, name, initialize=None, dirname=None):
+    """Get the store `name` of the current build variant.
+
+    `initialize` is called with the newly opened store, once per build. The
+    store is kept inside `dirname` instead of the variant directory when it
+    is given.
+    """
+    with _stores_lock:
+        try:
+            stores = bld._key_value_stores
+        except AttributeError:
+            stores = bld._key_value_stores = {}
+            add_post_fun = getattr(bld, 'add_post_fun', None)
+            if add_post_fun is not None:
+                add_post_fun(close_stores)
+
+        try:
+            return stores[name]
+        except KeyError:
+            pass
+
+        store = KeyValueStore(os.path.join(dirname or bld.variant_dir,
+                '.%s.db' % name))
+        if initialize is not None:
+            initialize(store)
+        stores[name] = store
+        return store
+
+
+def close_stores(bld):
+    with _stores_lock:
+        stores = getattr(bld, '_key_value_stores', {})
+        for store in stores.values():
+            store.close()
+        stores.clear()
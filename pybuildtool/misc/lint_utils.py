@@ -0,0 +1,118 @@
+"""
+Per-file results of linters, remembered between builds.
+
+Functions linting a single file are module level, so they can be run by a
+process pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+import json
+from .file_utils import file_hash
+from .key_value_store import get_store
+
+
+class LintCache(object):
+    """Results of linting files, kept until the file or the configuration of
+    the linter changes.
+    """
+
+    config = None
+    store = None
+
+    def __init__(self, bld, name, config):
+        self.store = get_store(bld, name)
+        self.config = sha1(json.dumps(config, sort_keys=True).encode(
+                'utf-8')).hexdigest()
+
+
+    def get(self, filename, digest=None):
+        """Returns hash of the file and its cached result, or None.
+
+        `digest` replaces the hash of the file, when the result depends on
+        more than the file.
+        """
+        if digest is None:
+            digest = file_hash(filename)
+        cached = self.store.get(filename)
+        if cached and cached[0] == digest and cached[1] == self.config:
+            return digest, cached[2]
+        return digest, None
+
+
+    def set(self, filename, digest, result):
+        self.store.set(filename, [digest, self.config, result])
+
+
+def lint_shards(task, cache, filenames, lint_shard):
+    """Lint files of `filenames` not found in `cache`, split into one shard
+    for each cpu token of `task`, every shard linted at once.
+
+    `lint_shard(filenames)` returns the exit code, the result of every file
+    and the output about none of them. Results are cached only when there
+    is no such output, it could be about a file of the shard.
+
+    Returns exit codes of the shards, results of every file in the order of
+    `filenames` and the outputs about none of them.
+    """
+    results = {}
+    digests = {}
+    for filename in filenames:
+        digests[filename], results[filename] = cache.get(filename)
+    lint = [f for f in filenames if results[f] is None]
+
+    statuses = []
+    other_outputs = []
+    shards = max(1, min(task.cpu_tokens, len(lint)))
+    with ThreadPoolExecutor(max_workers=shards) as executor:
+        futures = [executor.submit(lint_shard, lint[i::shards])\
+                for i in range(shards) if lint[i::shards]]
+        for future in futures:
+            status, shard_results, other_output = future.result()
+            statuses.append(status)
+            results.update(shard_results)
+            if other_output:
+                other_outputs.append(other_output)
+                continue
+            for filename, result in shard_results.items():
+                cache.set(filename, digests[filename], result)
+    return statuses, [(f, results[f]) for f in filenames], other_outputs
+
+
+def split_messages(filenames, output, ignore=()):
+    """Lines of `output` about every file of `filenames`, a message starts
+    with the file name followed by `:` or `(` and goes on in the indented
+    lines following it.
+
+    Returns {filename: lines} and the lines about none of the files, except
+    the ones starting with any of `ignore`.
+    """
+    messages = dict((filename, []) for filename in filenames)
+    other = []
+    lines = other
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        if line[0].isspace():
+            # continues the previous message
+            lines.append(line)
+            continue
+        for filename in filenames:
+            if line.startswith(filename) and\
+                    line[len(filename):len(filename) + 1] in (':', '('):
+                lines = messages[filename]
+                break
+        else:
+            if line.startswith(ignore):
+                lines = []
+                continue
+            lines = other
+        lines.append(line)
+    return messages, other
+
+
+def lint_rst_file(filename, encoding):
+    """Returns [type, level, line, message] of every error."""
+    from restructuredtext_lint import lint_file # pylint:disable=import-error
+
+    return [[error.type, error.level, error.line, error.message] for error\
+            in lint_file(filename, encoding=encoding)]
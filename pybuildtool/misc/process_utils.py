@@ -0,0 +1,23 @@
+"""
+Process pools started from the threads waf runs tasks in.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import sys
+
+
+def process_pool(max_workers):
+    """Returns a pool running functions in other processes.
+
+    Forking a process with several threads copies locks held by the other
+    threads, like the ones of logging or of the token store, and the child
+    can wait on them forever. The workers are started by a forkserver, or
+    spawned, instead. Python without `mp_context` gets a thread pool.
+    """
+    if sys.version_info < (3, 7):
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
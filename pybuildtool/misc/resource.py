@@ -1,6 +1,7 @@
 import os
 import re
-from ..core.group import Group
+from ..core.group import Group, keep_persistent_dirs
+from ..core.scheduler import prioritize_tasks
 from .collections_utils import make_list
 
 def get_source_files(conf, bld):
@@ -152,3 +153,5 @@ def prepare_targets(conf, bld):
         parse_group(group, conf[group], 1, None)
 
     bld.task_gen_cache_names = groups
+    prioritize_tasks(bld)
+    keep_persistent_dirs(bld)
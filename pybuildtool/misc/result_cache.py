@@ -0,0 +1,71 @@
+"""
+Files produced by tools, cached by a key derived from their inputs.
+
+The cache is kept outside of the build directory, so it survives `waf clean`
+and is shared by every variant and project of the user. It lives in
+``PYBUILDTOOL_CACHE_DIR``, by default ``~/.cache/pybuildtool``, and can be
+deleted at any time.
+"""
+from hashlib import sha1
+import os
+from uuid import uuid4
+from .file_utils import copy_file
+
+
+def get_cache_dir(name):
+    root = os.environ.get('PYBUILDTOOL_CACHE_DIR')
+    if not root:
+        root = os.path.join(os.environ.get('XDG_CACHE_HOME') or\
+                os.path.join(os.path.expanduser('~'), '.cache'),
+                'pybuildtool')
+    return os.path.join(root, name)
+
+
+def cache_key(*parts):
+    digest = sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+
+    dirname = None
+
+    def __init__(self, name):
+        self.dirname = get_cache_dir(name)
+
+
+    def _path(self, key):
+        return os.path.join(self.dirname, key[:2], key[2:])
+
+
+    def restore(self, key, dest):
+        """Copy cached file of `key` to `dest`, returns False if not cached.
+        """
+        try:
+            copy_file(self._path(key), dest, 'reflink')
+            return True
+        except (IOError, OSError):
+            return False
+
+
+    def save(self, key, src):
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by other thread or build
+                pass
+        # other builds may read it at the same time, only complete files are
+        # moved in place
+        temp_path = '%s.%s.tmp' % (path, uuid4().hex)
+        try:
+            copy_file(src, temp_path, 'reflink')
+            getattr(os, 'replace', os.rename)(temp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
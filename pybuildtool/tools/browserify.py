@@ -29,6 +29,7 @@ class Task(BaseTask):
         '_source_grouped_': True,
     }
     name = tool_name
+    memory_estimate = 512
 
     def prepare(self):
         args = self.args
@@ -1,8 +1,15 @@
 """ Merge files from sources into copious targets.
+
+Options:
+
+    * separator : str, None
+                : Text written between the merged files, for example ";\\n"
+                : for javascript.
+
 """
 import os
-from shutil import copyfileobj
 from pybuildtool import BaseTask
+from pybuildtool.misc.file_utils import copy_file_data, write_all
 
 tool_name = __name__
 
@@ -12,6 +19,13 @@ class Task(BaseTask):
         '_source_grouped_': True,
     }
     name = tool_name
+    separator = None
+
+    def prepare(self):
+        c = self.conf.get('separator')
+        if c:
+            self.separator = c.encode('utf-8')
+
 
     def perform(self):
         if len(self.file_out) != 1:
@@ -23,8 +37,12 @@ class Task(BaseTask):
 
         try:
             with open(self.file_out[0], 'wb') as dest:
-                for src in self.file_in:
-                    copyfileobj(open(src, 'rb'), dest)
+                dest_fd = dest.fileno()
+                for index, src in enumerate(self.file_in):
+                    if index and self.separator:
+                        write_all(dest_fd, self.separator)
+                    with open(src, 'rb') as f:
+                        copy_file_data(f.fileno(), dest_fd)
             return 0
-        except OSError:
+        except (IOError, OSError):
             return 1
@@ -1,7 +1,23 @@
 """ Copy files.
+
+Options:
+
+    * link    : str, 'copy'
+              : Used with `_source_tree_`, how files are copied, one of:
+              : copy, reflink (copy-on-write clone when the filesystem
+              : supports it), hardlink (destination shares its content with
+              : the source, do not modify it in place).
+    * workers : int, None
+              : Used with `_source_tree_`, number of files copied at once,
+              : default is the number of processors.
+
+A directory rule with `_source_tree_` option copies every file in one task,
+destinations with the same size and content as the source are left alone.
+
 """
 from shutil import copyfile, Error
 from pybuildtool import BaseTask
+from pybuildtool.misc.file_utils import copy_files
 
 tool_name = __name__
 
@@ -9,7 +25,18 @@ class Task(BaseTask):
 
     name = tool_name
 
+    LINK_TYPES = ('copy', 'reflink', 'hardlink')
+
+    def get_cpu_weight(self):
+        if self.conf.get('_source_tree_'):
+            return self.get_parallel_weight(self.conf.get('workers'))
+        return super(Task, self).get_cpu_weight()
+
+
     def perform(self):
+        if self.conf.get('_source_tree_'):
+            return self.perform_tree()
+
         if len(self.file_in) != 1:
             self.bld.fatal('%s only need one input' % tool_name.capitalize())
         if len(self.file_out) != 1:
@@ -24,3 +51,18 @@ class Task(BaseTask):
         except IOError:
             self.bld.fatal('destination location cannot be written')
         return 1
+
+
+    def perform_tree(self):
+        link = self.conf.get('link', 'copy')
+        if link not in self.LINK_TYPES:
+            self.bld.fatal('%s "link" option must be one of: %s' % (
+                    tool_name.capitalize(), ', '.join(self.LINK_TYPES)))
+
+        _, _, errors = copy_files(self.file_map, link=link,
+                workers=self.cpu_tokens)
+        for (src, dest, error) in errors:
+            print('Failed to copy %s to %s: %s' % (src, dest, error))
+        if errors:
+            return 1
+        return 0
@@ -6,7 +6,12 @@ Options:
     * work_dir      : str, None, change current directory
     * build_dir     : str, None, Analysis output directory. Useful for various
                       data. Some possible usages are; whole program analysis,
-                      incremental analysis, distributed analysis.
+                      incremental analysis, distributed analysis. By
+                      default every rule has its own directory inside the
+                      variant's build directory, created when missing, so
+                      only changed translation units are analysed again.
+    * persistent    : bool, True, Keep build_dir when running `waf clean`,
+                      if it is inside the build directory.
     * check_library : bool, None, Show information messages when library files
                       have incomplete info.
     * config_exclude: list, [], Path (prefix) to be excluded from
@@ -70,7 +75,8 @@ Options:
                       `// cppcheck-suppress warningId` on the lines before the
                       warning to suppress.
     * jobs          : int, None, Start <jobs> threads to do the checking
-                      simultaneously.
+                      simultaneously. Limited by the cpu budget of the build
+                      (waf's `-j`), by default all cpu granted to the task.
     * load_average  : float, None, Specifies that no new threads should be
                       started if there are other threads running and the load
                       average at least <load>.
@@ -157,6 +163,7 @@ Requirements:
       to install, for example run `apt-get install cppcheck`
 
 """
+import os
 from pybuildtool import BaseTask, expand_resource, make_list
 
 tool_name = __name__
@@ -166,6 +173,24 @@ class Task(BaseTask):
     name = tool_name
     workdir = None
 
+    def get_build_dir(self):
+        c = self.conf.get('build_dir')
+        if c:
+            return expand_resource(self.group, c)
+        return self.get_state_dir(tool_name)
+
+
+    def declare_persistent_dirs(self):
+        build_dir = self.get_build_dir()
+        if build_dir and self.conf.get('persistent', True):
+            return [build_dir]
+        return []
+
+
+    def get_cpu_weight(self):
+        return self.get_parallel_weight(self.conf.get('jobs'))
+
+
     def prepare(self):
         cfg = self.conf
         args = self.args
@@ -180,10 +205,12 @@ class Task(BaseTask):
                 self.bld.fatal(cfg['work_dir'] + ' not found.')
 
         # Build dir
-        c = cfg.get('build_dir')
-        if c:
-            args.append('--cppcheck-build-dir=' + expand_resource(self.group,
-                    c))
+        build_dir = self.get_build_dir()
+        if build_dir is None:
+            self.bld.fatal(cfg['build_dir'] + ' not found.')
+        if not os.path.isdir(build_dir):
+            os.makedirs(build_dir)
+        args.append('--cppcheck-build-dir=' + build_dir)
 
         # Check library
         c = cfg.get('check_library')
@@ -246,9 +273,8 @@ class Task(BaseTask):
             args.append('--inline-suppr')
 
         # Parallel
-        c = cfg.get('jobs')
-        if c:
-            args.append('-j %i' % c)
+        if self.cpu_tokens > 1:
+            args.append('-j %i' % self.cpu_tokens)
 
         # Max processor usage
         c = cfg.get('load_average')
@@ -1,12 +1,31 @@
 """
 gzip compress files.
 
+Options:
+
+    * engine     : str, 'zlib'
+                   zlib: compress in process, output has no file name and no
+                         timestamp, it is the same for the same input
+                   gzip: run the gzip program
+    * level      : int, 9
+                   Compression level [1-9]
+    * block_size : int, 131072
+                   Files larger than this are split into blocks of this size
+                   compressed in parallel, for engine zlib
+    * workers    : int, None
+                   Number of blocks compressed at once, default is the
+                   number of processors
+
 Requirements:
 
     * gzip
+      only for engine gzip
 
 """
+from concurrent.futures import ThreadPoolExecutor
+import os
 from pybuildtool import BaseTask
+from pybuildtool.misc.gzip_utils import DEFAULT_BLOCK_SIZE, gzip_file
 
 tool_name = __name__
 
@@ -17,8 +36,21 @@ class Task(BaseTask):
     }
     name = tool_name
 
+    def get_cpu_weight(self):
+        if self.conf.get('engine', 'zlib') != 'zlib':
+            return super(Task, self).get_cpu_weight()
+        block_size = self.conf.get('block_size', DEFAULT_BLOCK_SIZE)
+        blocks = sum(os.path.getsize(f) for f in self.file_in\
+                if os.path.exists(f)) // block_size + 1
+        return self.get_parallel_weight(self.conf.get('workers'), blocks)
+
+
     def prepare(self):
-        self.args = ['--stdout', '--best']
+        level = self.conf.get('level', 9)
+        if level == 9:
+            self.args = ['--stdout', '--best']
+        else:
+            self.args = ['--stdout', '-%i' % level]
 
 
     def perform(self):
@@ -28,7 +60,34 @@ class Task(BaseTask):
             self.bld.fatal('%s can only have one output' %\
                     tool_name.capitalize())
 
+        engine = self.conf.get('engine', 'zlib')
+        if engine == 'gzip':
+            return self.perform_gzip()
+        elif engine != 'zlib':
+            self.bld.fatal('%s engine must be one of: zlib, gzip' %\
+                    tool_name.capitalize())
+
+        level = self.conf.get('level', 9)
+        block_size = self.conf.get('block_size', DEFAULT_BLOCK_SIZE)
+        try:
+            if self.cpu_tokens > 1:
+                with ThreadPoolExecutor(max_workers=self.cpu_tokens) as\
+                        executor:
+                    gzip_file(self.file_in[0], self.file_out[0], level,
+                            block_size, executor)
+            else:
+                gzip_file(self.file_in[0], self.file_out[0], level,
+                        block_size)
+            return 0
+        except (IOError, OSError):
+            return 1
+
+
+    def perform_gzip(self):
         executable = self.env['%s_BIN' % tool_name.upper()]
+        if not executable:
+            self.bld.fatal('%s engine gzip needs the gzip program' %\
+                    tool_name.capitalize())
         return self.exec_command(
             '{exe} {arg} {in_} > {out}'.format(
             exe=executable,
@@ -39,4 +98,6 @@ class Task(BaseTask):
 
 
 def configure(conf):
-    conf.env['%s_BIN' % tool_name.upper()] = conf.find_program('gzip')[0]
+    bin_path = conf.find_program('gzip', mandatory=False)
+    if bin_path:
+        conf.env['%s_BIN' % tool_name.upper()] = bin_path[0]
@@ -9,6 +9,11 @@ Options:
                 names, capitalization, quotation, indentation, formatting,
                 boolean_attribute, invalid_attribute, void_zero,
                 invalid_handler, http_equiv, extra_whitespace
+    * workers : int, None, number of files linted at once, default is the
+                number of processors
+
+Every file is linted, errors of all of them are reported. Results of every
+file are remembered until the file or the options change.
 
 Requirements:
 
@@ -17,6 +22,7 @@ Requirements:
 
 """
 from pybuildtool import BaseTask, make_list
+from pybuildtool.misc.lint_utils import LintCache, lint_shards
 
 tool_name = __name__
 
@@ -34,6 +40,11 @@ class Task(BaseTask):
     }
     name = tool_name
 
+    def get_cpu_weight(self):
+        return self.get_parallel_weight(self.conf.get('workers'),
+                len(self.file_in))
+
+
     def prepare(self):
         cfg = self. conf
         args = self.args
@@ -48,20 +59,38 @@ class Task(BaseTask):
 
 
     def perform(self):
-        executable = self.env['%s_BIN' % tool_name.upper()]
-        for file_in in self.file_in:
-            return_code = self.exec_command(
-                '{exe} {arg} {in_}'.format(
-                exe=executable,
-                arg=' '.join(self.args),
-                in_=file_in,
-            ))
+        cache = LintCache(self.bld, tool_name, self.args)
+        _, results, _ = lint_shards(self, cache, self.file_in, self.lint)
+
+        failed = 0
+        for filename, (return_code, output) in results:
+            if output:
+                print(output.rstrip('\n'))
             if return_code:
-                print('Found syntax errors in %s\n' % file_in)
-                return 1
+                print('Found syntax errors in %s\n' % filename)
+                failed += 1
+
+        if failed:
+            return 1
         return 0
 
 
+    def lint(self, filenames):
+        # exit code of every file is needed, they are linted one by one
+        results = dict((f, self.lint_file(f)) for f in filenames)
+        return max(ret for (ret, _) in results.values()), results, None
+
+
+    def lint_file(self, filename):
+        executable = self.env['%s_BIN' % tool_name.upper()]
+        return self.exec_command_output(
+            '{exe} {arg} {in_}'.format(
+            exe=executable,
+            arg=' '.join(self.args),
+            in_=filename,
+        ))
+
+
 def configure(conf):
     bin_path = conf.find_program('html_lint.py')[0]
     conf.env['%s_BIN' % tool_name.upper()] = bin_path
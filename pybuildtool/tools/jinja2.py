@@ -13,6 +13,27 @@ Options:
                       it must have variable type dict named: `export`
     * context_yaml  : str, None, yaml file containing context for template
     * context       : any, {}, context to be used in template
+    * with_items    : str, None, dot separated dictionary keys for `context`,
+                      or a list, the template is rendered once for every
+                      item, like `ansibleplay`
+                      the item is available as `item` in the template, keys
+                      of dictionary items are also available by themselves
+    * item_out      : str, None, path of the output of every item, formatted
+                      with the item's keys, for example: "products/{slug}.html"
+                      required with `with_items`, the rule has no file_out,
+                      written inside the build directory like file_out
+    * raw_item_out  : str, None, like `item_out`, but written in the actual
+                      file system like raw_file_out, relative paths are
+                      relative to the project directory
+    * workers       : int, None, number of items rendered at once, default is
+                      the number of processors
+
+Tasks with the same `search_dir` share one jinja2 environment, compiled
+templates are also cached on disk, see PYBUILDTOOL_CACHE_DIR. Context files
+are loaded once per build.
+
+Templates extended, included or imported by the input, directly or not,
+are found automatically, they do not need to be listed in `depend_in`.
 
 Requirements:
 
@@ -20,13 +41,117 @@ Requirements:
       to install, run `pip install jinja2`
 
 """
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
 import os
 import sys
+from threading import Lock
 from yaml import safe_load as yaml_load
-from pybuildtool import BaseTask, expand_resource, is_non_string_iterable
+from pybuildtool import BaseTask, expand_resource, is_non_string_iterable,\
+        make_list
+from pybuildtool.core.rule import is_token_node
+from pybuildtool.misc.file_utils import copy_file, file_hash
+from pybuildtool.misc.key_value_store import get_store
+from pybuildtool.misc.result_cache import get_cache_dir
 
 tool_name = __name__
 
+_build_lock = Lock()
+
+
+def get_environment(bld, search_dir):
+    """Environment shared by every task of the build with the same
+    `search_dir`.
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache,\
+            FileSystemLoader # pylint:disable=import-error
+
+    with _build_lock:
+        try:
+            environments = bld._jinja2_environments
+        except AttributeError:
+            environments = bld._jinja2_environments = {}
+
+        key = tuple(search_dir)
+        if key not in environments:
+            cache_dir = get_cache_dir(tool_name)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            environments[key] = Environment(
+                    loader=FileSystemLoader(search_dir),
+                    bytecode_cache=FileSystemBytecodeCache(cache_dir))
+        return environments[key]
+
+
+def _load_yaml_context(filename):
+    with open(filename, 'r') as f:
+        return yaml_load(f)
+
+
+def _load_python_context(filename):
+    dirname, basename = os.path.split(filename)
+    filebase, _ = os.path.splitext(basename)
+    if os.path.exists(os.path.join(dirname, '__init__.py')):
+        if dirname not in sys.path:
+            sys.path.append(dirname)
+        mod = __import__(filebase)
+    else:
+        try:
+            from importlib.machinery import SourceFileLoader
+            mod = SourceFileLoader('context_python',
+                    filename).load_module()
+        except ImportError:
+            import imp
+            mod = imp.load_source('context_python', filename)
+    return mod.export
+
+
+def load_context(bld, filename, loader):
+    """Context from `filename`, loaded once per build for every content of
+    the file.
+    """
+    with open(filename, 'rb') as f:
+        key = (loader.__name__, sha1(f.read()).hexdigest())
+    with _build_lock:
+        try:
+            contexts = bld._jinja2_contexts
+        except AttributeError:
+            contexts = bld._jinja2_contexts = {}
+        if key not in contexts:
+            contexts[key] = loader(filename)
+        return contexts[key]
+
+
+def find_referenced_templates(bld, env, filename):
+    """Names of templates extended, included or imported by `filename`,
+    remembered between builds until the template changes.
+    """
+    from jinja2 import meta # pylint:disable=import-error
+
+    with _build_lock:
+        try:
+            references = bld._jinja2_references
+        except AttributeError:
+            references = bld._jinja2_references = {}
+    if filename in references:
+        return references[filename]
+
+    store = get_store(bld, tool_name + '-references')
+    digest = file_hash(filename)
+    cached = store.get(filename)
+    if cached and cached[0] == digest:
+        names = cached[1]
+    else:
+        with open(filename, 'rb') as f:
+            source = f.read().decode('utf-8')
+        # dynamic names are None
+        names = sorted(x for x in meta.find_referenced_templates(
+                env.parse(source)) if x)
+        store.set(filename, [digest, names])
+    references[filename] = names
+    return names
+
+
 class Task(BaseTask):
 
     conf = {
@@ -34,63 +159,139 @@ class Task(BaseTask):
     }
     name = tool_name
     search_dir = ['.']
-    context = {}
+    context = None
 
-    def prepare(self):
-        cfg = self.conf
+    def __init__(self, *args, **kwargs):
+        super(Task, self).__init__(*args, **kwargs)
+        self.context = {}
 
-        # Change current directory
-        c = cfg.get('search_dir', [])
+
+    def get_search_dir(self):
+        c = self.conf.get('search_dir', [])
         if c:
             if not is_non_string_iterable(c):
                 c = [c]
             c = [x for x in (expand_resource(self.group, f) for f\
                     in c) if x]
-        if c:
-            self.search_dir = c
-        else:
+        if not c:
             self.bld.fatal(('"search_dir" is required configuration '
                 'for %s') % tool_name.capitalize())
+        return c
+
+
+    def scan(self):
+        """Templates the input depends on, waf runs the task again when one
+        of them changes.
+        """
+        search_dir = self.get_search_dir()
+        env = get_environment(self.bld, search_dir)
+        templates = [node.abspath() for node in self.inputs\
+                if not is_token_node(node) and not getattr(node,
+                'is_virtual_in_' + self._id, False)][:1]
+
+        found = set(templates)
+        nodes = []
+        while templates:
+            filename = templates.pop()
+            for name in find_referenced_templates(self.bld, env, filename):
+                for d in search_dir:
+                    path = os.path.join(d, name)
+                    if os.path.isfile(path):
+                        break
+                else:
+                    # could be created by other rule, jinja2 will tell
+                    continue
+                if path in found:
+                    continue
+                found.add(path)
+                templates.append(path)
+                nodes.append(self.bld.root.find_resource(path.lstrip('/')))
+        return ([node for node in nodes if node is not None], [])
+
+
+    def load_context(self):
+        cfg = self.conf
+        bld = self.group.context
+        context = {}
 
         # Yaml context
         c = cfg.get('context_yaml')
         if c:
             yaml_file = expand_resource(self.group, c)
             if yaml_file is None:
-                self.bld.fatal('"context_yaml" for %s has invalid value' %\
+                bld.fatal('"context_yaml" for %s has invalid value' %\
                         tool_name.capitalize())
-            with open(yaml_file, 'r') as f:
-                self.context.update(yaml_load(f))
+            context.update(load_context(bld, yaml_file, _load_yaml_context))
 
         # Python context
         c = cfg.get('context_python')
         if c:
             python_file = expand_resource(self.group, c)
             if python_file is None:
-                self.bld.fatal('"context_python" for %s has invalid value' %\
+                bld.fatal('"context_python" for %s has invalid value' %\
                         tool_name.capitalize())
-            dirname, filename = os.path.split(python_file)
-            filebase, _ = os.path.splitext(filename)
-            if os.path.exists(os.path.join(dirname, '__init__.py')):
-                sys.path.append(dirname)
-                mod = __import__(filebase)
+            context.update(load_context(bld, python_file,
+                    _load_python_context))
+
+        context.update(cfg.get('context', {}))
+        return context
+
+
+    def get_items(self, context):
+        """Pairs of (item, output file) of `with_items`."""
+        c = self.conf.get('with_items')
+        if isinstance(c, list):
+            wi = list(c)
+        elif c:
+            wi = context
+            for wi_idx in c.split('.'):
+                wi = wi[wi_idx]
+            wi = make_list(wi, nodict=True)
+        else:
+            return []
+
+        # relative outputs are declared inside the build directory, like
+        # file_out
+        item_out = self.conf.get('item_out')
+        root = ''
+        if not item_out:
+            item_out = self.conf.get('raw_item_out')
+            if not item_out:
+                self.group.context.fatal('"item_out" is required with '
+                        '"with_items" for %s' % tool_name.capitalize())
+            root = self.group.context.path.abspath()
+        patterns = self.group.get_patterns()
+
+        result = []
+        for wi_item in wi:
+            if isinstance(wi_item, dict):
+                values = dict(patterns, **wi_item)
             else:
-                try:
-                    from importlib.machinery import SourceFileLoader
-                    mod = SourceFileLoader('context_python',
-                            python_file).load_module()
-                except ImportError:
-                    import imp
-                    mod = imp.load_source('context_python', python_file)
-                python_export = mod.export
-            self.context.update(python_export)
+                values = dict(patterns, item=wi_item)
+            result.append((wi_item, os.path.join(root,
+                    item_out.format(**values))))
+        return result
 
-        self.context.update(cfg.get('context', {}))
 
+    def declare_extra_out(self, file_in, file_out):
+        if not self.conf.get('with_items'):
+            return []
+        return [out for (_, out) in self.get_items(self.load_context())]
 
-    def perform(self):
-        from jinja2 import Environment, FileSystemLoader # pylint:disable=import-error
 
+    def get_cpu_weight(self):
+        if self.conf.get('with_items'):
+            return self.get_parallel_weight(self.conf.get('workers'))
+        return super(Task, self).get_cpu_weight()
+
+
+    def prepare(self):
+        # Change current directory
+        self.search_dir = self.get_search_dir()
+        self.context.update(self.load_context())
+
+
+    def perform(self):
         if len(self.file_in) != 1:
             self.bld.fatal('%s only need one input' % tool_name.capitalize())
         template_name = self.file_in[0]
@@ -103,11 +304,62 @@ class Task(BaseTask):
             self.bld.fatal('input for %s must be within `search_dir' %\
                     tool_name.capitalize())
 
-        loader = FileSystemLoader(self.search_dir)
-        env = Environment(loader=loader)
+        env = get_environment(self.bld, self.search_dir)
         template = env.get_template(template_name)
-        rendered = template.render(self.context)
-        for out in self.file_out:
-            with open(out, 'w') as f:
-                f.write(rendered)
+        if self.conf.get('with_items'):
+            return self.perform_items(template)
+        if not self.file_out:
+            return 0
+        template.stream(self.context).dump(self.file_out[0])
+        for out in self.file_out[1:]:
+            copy_file(self.file_out[0], out)
         return 0
+
+
+    def perform_items(self, template):
+        if len(self.file_out) != 0:
+            self.bld.fatal('%s with "with_items" writes to "item_out", it '
+                    'needs no output' % tool_name.capitalize())
+
+        build_dir = self.bld.bldnode.abspath()
+        with ThreadPoolExecutor(max_workers=self.cpu_tokens) as executor:
+            results = [(out, executor.submit(self.render_item, template,
+                    item, os.path.join(build_dir, out))) for (item, out)\
+                    in self.get_items(self.context)]
+            failed = 0
+            for out, future in results:
+                try:
+                    future.result()
+                except Exception as e: # pylint:disable=broad-except
+                    print('Failed to render %s: %s' % (out, e))
+                    failed += 1
+
+        if failed:
+            return 1
+        return 0
+
+
+    def render_item(self, template, item, out):
+        context = dict(self.context, item=item)
+        if isinstance(item, dict):
+            context.update(item)
+        rendered = template.render(context).encode('utf-8')
+
+        # unchanged outputs are not written again
+        try:
+            if os.path.getsize(out) == len(rendered):
+                with open(out, 'rb') as f:
+                    if f.read() == rendered:
+                        return
+        except (IOError, OSError):
+            pass
+
+        dirname = os.path.dirname(out)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by other thread
+                pass
+        with open(out, 'wb') as f:
+            f.write(rendered)
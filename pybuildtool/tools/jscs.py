@@ -16,6 +16,9 @@ Options:
                          checkstyle, junit, inline
                          also accepts relative or absolute path to custom
                          reporter
+    * changed_only     : bool, True, only lint files changed since the last
+                         successful run, all of them when options or
+                         configuration files change
 
 Requirements:
 
@@ -27,6 +30,7 @@ Requirements:
 
 import os
 from pybuildtool import BaseTask
+from pybuildtool.misc.file_utils import file_hash
 
 tool_name = __name__
 
@@ -79,13 +83,31 @@ class Task(BaseTask):
             args.append('--reporter=%s' % cfg['reporter'])
 
 
+    def get_config_hash(self):
+        bld = self.group.context
+        # found by jscs in the project directory when not given
+        filenames = [os.path.join(bld.path.abspath(), f) for f\
+                in ('.jscsrc', '.jscs.json')]
+        c = self.conf.get('config_file')
+        if c:
+            filenames.append(bld.path.find_resource(c).abspath())
+        return [file_hash(f) for f in filenames if os.path.exists(f)]
+
+
     def perform(self):
+        file_in = self.file_in
+        if self.conf.get('changed_only', True):
+            file_in = self.get_changed_inputs([self.args,
+                    self.get_config_hash()])
+            if not file_in:
+                return 0
+
         executable = self.env['%s_BIN' % tool_name.upper()]
         return self.exec_command(
             '{exe} {arg} {in_}'.format(
             exe=executable,
             arg=' '.join(self.args),
-            in_=' '.join(self.file_in),
+            in_=' '.join(file_in),
         ))
 
 
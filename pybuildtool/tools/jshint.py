@@ -7,6 +7,9 @@ Options:
     * reporter         : str, None, custom reporter
     * ignore_files     : list, [],  excludes files matching pattern
     * ignore_list_file : str, None, jshintignore file
+    * changed_only     : bool, True, only lint files changed since the last
+                         successful run, all of them when options or
+                         configuration files change
 
 Requirements:
 
@@ -18,6 +21,7 @@ Requirements:
 
 import os
 from pybuildtool import BaseTask, make_list
+from pybuildtool.misc.file_utils import file_hash
 
 tool_name = __name__
 
@@ -54,13 +58,32 @@ class Task(BaseTask):
                 cfg['ignore_list_file']).abspath())
 
 
+    def get_config_hash(self):
+        bld = self.group.context
+        # found by jshint in the project directory when not given
+        filenames = [os.path.join(bld.path.abspath(), f) for f\
+                in ('.jshintrc', '.jshintignore')]
+        for option in ('config_file', 'ignore_list_file'):
+            if self.conf.get(option):
+                filenames.append(bld.path.find_resource(
+                        self.conf[option]).abspath())
+        return [file_hash(f) for f in filenames if os.path.exists(f)]
+
+
     def perform(self):
+        file_in = self.file_in
+        if self.conf.get('changed_only', True):
+            file_in = self.get_changed_inputs([self.args,
+                    self.get_config_hash()])
+            if not file_in:
+                return 0
+
         executable = self.env['%s_BIN' % tool_name.upper()]
         return self.exec_command(
             '{exe} {arg} {in_}'.format(
             exe=executable,
             arg=' '.join(self.args),
-            in_=' '.join(self.file_in),
+            in_=' '.join(file_in),
         ))
 
 
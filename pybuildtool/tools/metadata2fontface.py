@@ -10,6 +10,18 @@ Options:
                      Print the stated font types.
     * font_svg_id  : str, None
                      Default is the font's PostScript name.
+    * workers      : int, None
+                     Number of files parsed at once, default is the number
+                     of processors.
+
+With `_source_grouped_` option, families of every input are written into one
+stylesheet, with `_source_tree_` option and a directory output, one
+stylesheet per family is written, in one task. Parsed files are remembered
+until their content changes.
+
+In a directory output, `<family>/METADATA.pb` is written as `<family>.css`.
+Families with the same directory name need `_source_basedir_` to keep their
+parent directories, or their own `replace_patterns`.
 
 Requirements:
 
@@ -17,13 +29,20 @@ Requirements:
       to install, run `pip install protobuf`
 
 """
-import json
+from hashlib import sha1
+import os
 from pybuildtool import BaseTask, make_list
+from pybuildtool.misc.font_metadata import read_fonts
+from pybuildtool.misc.key_value_store import get_store
+from pybuildtool.misc.process_utils import process_pool
 
 tool_name = __name__
 
 class Task(BaseTask):
 
+    conf = {
+        'replace_patterns': ((r'/METADATA\.(pb|json)$', '.css'),),
+    }
     name = tool_name
 
     dir_url = None
@@ -48,59 +67,108 @@ class Task(BaseTask):
         self.svg_id = cfg.get('font_svg_id')
 
 
-    def perform(self):
-        if len(self.file_in) != 1:
-            self.bld.fatal('%s only needs one input' % tool_name.capitalize())
-        if len(self.file_out) != 1:
-            self.bld.fatal('%s only needs one output' % tool_name.capitalize())
-
-        filename = self.file_in[0]
-        if filename.endswith('.json'):
-            with open(self.file_in[0], 'r') as f:
-                fonts = json.load(f)['fonts']
-        elif filename.endswith('.pb'):
-            fonts = self._get_fonts_from_protobuf(filename)
-        else:
-            self.bld.fatal('Unknown file format: ' + filename)
-
-        with open(self.file_out[0], 'w') as f:
-            for font in fonts:
-                f.write('@font-face {\n')
-                f.write('    font-family: "%s";\n' % font['name'])
-                f.write('    font-style: %s;\n' % font['style'])
-                f.write('    font-weight: %i;\n' % font['weight'])
-                f.write('    src:\n')
-                f.write('        local("%s")' % font['fullName'])
-
-                arg = {'dir': self.dir_url, 'name': font['postScriptName']}
-
-                if self.print_eot:
-                    f.write((',\n        url({dir}{name}.eot?#iefix) ' +\
-                            'format("embedded-opentype")').format(**arg))
-
-                if self.print_woff:
-                    f.write((',\n        url({dir}{name}.woff) ' +\
-                            'format("woff")').format(**arg))
+    def get_cpu_weight(self):
+        if self.conf.get('_source_tree_') or\
+                self.conf.get('_source_grouped_'):
+            return self.get_parallel_weight(self.conf.get('workers'))
+        return super(Task, self).get_cpu_weight()
 
-                if self.print_ttf:
-                    f.write((',\n        url({dir}{name}.ttf) ' +\
-                            'format("truetype")').format(**arg))
 
-                if self.print_svg:
-                    arg['id'] = self.svg_id or font['postScriptName']
-                    f.write((',\n        url({dir}{name}.svg#{id}) ' +\
-                            'format("svg")').format(**arg))
-
-                f.write(';\n}\n')
-
-
-    def _get_fonts_from_protobuf(self, filename):
-        from google.protobuf import text_format # pylint:disable=import-error,no-name-in-module
-        from pybuildtool.vendor.fonts_public_pb2 import FamilyProto
-
-        message = FamilyProto()
-        with open(filename) as f:
-            text_format.Merge(f.read(), message)
-
-        for font in message.fonts:
-            yield {t[0].json_name: t[1] for t in font.ListFields()}
+    def perform(self):
+        if self.conf.get('_source_tree_'):
+            outputs = [(dest, [src]) for (src, dest) in self.file_map]
+            dests = [dest for (dest, _) in outputs]
+            for dest in set(dests):
+                if dests.count(dest) > 1:
+                    self.bld.fatal('%s writes more than one family into %s,'\
+                            ' set _source_basedir_ or replace_patterns' % (
+                            tool_name.capitalize(), dest))
+        else:
+            if len(self.file_in) != 1 and\
+                    not self.conf.get('_source_grouped_'):
+                self.bld.fatal('%s only needs one input' %\
+                        tool_name.capitalize())
+            if len(self.file_out) != 1:
+                self.bld.fatal('%s only needs one output' %\
+                        tool_name.capitalize())
+            outputs = [(self.file_out[0], self.file_in)]
+
+        try:
+            families = self.read_families(sorted(set(src for (_, sources)\
+                    in outputs for src in sources)))
+        except ValueError as e:
+            self.bld.fatal(str(e))
+
+        for (dest, sources) in outputs:
+            css = ''.join(self.format_font(font) for src in sources\
+                    for font in families[src])
+            dest_dir = os.path.dirname(dest)
+            if not os.path.isdir(dest_dir):
+                os.makedirs(dest_dir)
+            with open(dest, 'w') as f:
+                f.write(css)
+        return 0
+
+
+    def read_families(self, filenames):
+        """Returns fonts of every family, parsed files are cached by their
+        hash.
+        """
+        store = get_store(self.bld, tool_name)
+        families = {}
+        parse = []
+        for filename in filenames:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            digest = sha1(data).hexdigest()
+            cached = store.get(filename)
+            if cached and cached[0] == digest:
+                families[filename] = cached[1]
+            else:
+                parse.append((filename, digest, data))
+
+        # protobuf's text format parser is python code, it is run in other
+        # processes to use more than one processor
+        if len(parse) > 1 and self.cpu_tokens > 1:
+            with process_pool(min(self.cpu_tokens, len(parse))) as executor:
+                results = list(executor.map(read_fonts,
+                        [x[0] for x in parse], [x[2] for x in parse]))
+        else:
+            results = [read_fonts(x[0], x[2]) for x in parse]
+
+        for ((filename, digest, _), fonts) in zip(parse, results):
+            store.set(filename, [digest, fonts])
+            families[filename] = fonts
+        return families
+
+
+    def format_font(self, font):
+        arg = {'dir': self.dir_url, 'name': font['postScriptName']}
+        css = [
+            '@font-face {\n',
+            '    font-family: "%s";\n' % font['name'],
+            '    font-style: %s;\n' % font['style'],
+            '    font-weight: %i;\n' % font['weight'],
+            '    src:\n',
+            '        local("%s")' % font['fullName'],
+        ]
+
+        if self.print_eot:
+            css.append((',\n        url({dir}{name}.eot?#iefix) ' +\
+                    'format("embedded-opentype")').format(**arg))
+
+        if self.print_woff:
+            css.append((',\n        url({dir}{name}.woff) ' +\
+                    'format("woff")').format(**arg))
+
+        if self.print_ttf:
+            css.append((',\n        url({dir}{name}.ttf) ' +\
+                    'format("truetype")').format(**arg))
+
+        if self.print_svg:
+            arg['id'] = self.svg_id or font['postScriptName']
+            css.append((',\n        url({dir}{name}.svg#{id}) ' +\
+                    'format("svg")').format(**arg))
+
+        css.append(';\n}\n')
+        return ''.join(css)
@@ -26,6 +26,7 @@ Options:
                     : build with. If the switch is not used, the default value
                     : used is 1. If the switch is used without a value MSBuild
                     : will use up to the number of processors on the computer.
+                    : Limited by the cpu budget of the build (waf's `-j`).
 
     * tools_version : str, None
                     : The version of the MSBuild Toolset (tasks, targets, etc.)
@@ -245,6 +246,17 @@ tool_name = __name__
 class Task(BaseTask):
 
     name = tool_name
+    memory_estimate = 1024
+
+    def get_cpu_weight(self):
+        c = self.conf.get('max_cpu_count')
+        if c is None:
+            return super(Task, self).get_cpu_weight()
+        if c == '':
+            # msbuild will use every processor
+            return self.get_parallel_weight()
+        return self.get_parallel_weight(int(c))
+
 
     def prepare(self):
         cfg = self.conf
@@ -260,10 +272,7 @@ class Task(BaseTask):
 
         c = cfg.get('max_cpu_count')
         if c is not None:
-            if len(c) == 0:
-                arg.append('/maxcpucount')
-            else:
-                arg.append('/maxcpucount:%i' % int(c))
+            arg.append('/maxcpucount:%i' % self.cpu_tokens)
 
         c = cfg.get('tools_version')
         if c:
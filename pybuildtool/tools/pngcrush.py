@@ -87,6 +87,27 @@ Options:
                       b[efore_IDAT]|a[fter_IDAT] "keywrod" "text"
     * quiet         : bool,  True
                       quiet
+    * cache         : bool,  True
+                      Reuse images crushed before with the same arguments,
+                      even by other variants or before `waf clean`, see
+                      PYBUILDTOOL_CACHE_DIR, only results of brute-force
+                      are kept
+    * workers       : int,   None
+                      Used with `_source_tree_`, number of pngcrush processes
+                      run at once, default is the number of processors
+    * learn         : bool,  True
+                      Remember the best method found by brute-force for each
+                      image, later builds try only that method and its
+                      neighbours, unless `method` is given
+    * neighbours    : int,   2
+                      Number of methods on each side of the learned method
+                      also tried
+    * brute_every   : int,   10
+                      Use brute-force again after this many builds of an
+                      image with the learned method, or when the image
+                      compresses worse than with brute-force
+
+A directory rule with `_source_tree_` option crushes every image in one task.
 
 Requirements:
 
@@ -94,13 +115,36 @@ Requirements:
       to install, for example run `apt-get install pngcrush`
 
 """
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
 from pybuildtool import BaseTask
+from pybuildtool.misc.file_utils import file_hash
+from pybuildtool.misc.key_value_store import get_store
+from pybuildtool.misc.result_cache import ResultCache, cache_key
 
 tool_name = __name__
 
 class Task(BaseTask):
 
     name = tool_name
+    cache = None
+    store = None
+
+    brute_arg = None
+    brute_methods = None
+
+    # pngcrush's report of the method it kept
+    BEST_METHOD_RE = re.compile(r'Best pngcrush method\s*=\s*(\d+)')
+    # learned method is used again as long as the image compresses at least
+    # this well compared to brute-force
+    REGRESSION_TOLERANCE = 0.01
+
+    def get_cpu_weight(self):
+        if self.conf.get('_source_tree_'):
+            return self.get_parallel_weight(self.conf.get('workers'))
+        return super(Task, self).get_cpu_weight()
+
 
     def prepare(self):
         cfg = self.conf
@@ -123,7 +167,9 @@ class Task(BaseTask):
             args.append('-blacken')
 
         # use brute-force: try 138 different methods [11-148]
-        args.append('-brute=%i' % cfg.get('brute', 148))
+        self.brute_methods = cfg.get('brute', 148)
+        self.brute_arg = '-brute=%i' % self.brute_methods
+        args.append(self.brute_arg)
 
         # color_type of output file [0, 2, 4, or 6]
         if cfg.get('color_type', None):
@@ -275,21 +321,134 @@ class Task(BaseTask):
 
 
     def perform(self):
-        if len(self.file_in) != 1:
-            self.bld.fatal('%s only need one input' % tool_name.capitalize())
-        if len(self.file_out) != 1:
-            self.bld.fatal('%s can only have one output' %\
-                    tool_name.capitalize())
-
+        if self.conf.get('_source_tree_'):
+            file_map = self.file_map
+        else:
+            if len(self.file_in) != 1:
+                self.bld.fatal('%s only need one input' %\
+                        tool_name.capitalize())
+            if len(self.file_out) != 1:
+                self.bld.fatal('%s can only have one output' %\
+                        tool_name.capitalize())
+            file_map = [(self.file_in[0], self.file_out[0])]
+
+        if self.conf.get('cache', True):
+            self.cache = ResultCache(tool_name)
+        if self.conf.get('learn', True) and not self.conf.get('method'):
+            self.store = get_store(self.bld, tool_name)
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.cpu_tokens) as executor:
+            results = [(src, executor.submit(self.crush, src, dest))\
+                    for (src, dest) in file_map]
+            for src, future in results:
+                try:
+                    ret = future.result()
+                except (IOError, OSError) as e:
+                    print('Failed to crush %s: %s' % (src, e))
+                    ret = 1
+                if ret:
+                    failed += 1
+
+        if failed:
+            return 1
+        return 0
+
+
+    def crush(self, src, dest):
+        key = None
+        if self.cache is not None:
+            key = cache_key(file_hash(src), ' '.join(self.args))
+            if self.cache.restore(key, dest):
+                return 0
+
+        dest_dir = os.path.dirname(dest)
+        if not os.path.isdir(dest_dir):
+            try:
+                os.makedirs(dest_dir)
+            except OSError:
+                # created by other thread
+                pass
+
+        ret = self.crush_learned(src, dest)
+        if ret is not None:
+            # the key stands for brute-force, not for a replayed method
+            return ret
+        ret = self.crush_brute(src, dest)
+        if ret == 0 and key is not None:
+            self.cache.save(key, dest)
+        return ret
+
+
+    def crush_learned(self, src, dest):
+        """Try the method learned by brute-force and its neighbours.
+
+        Returns None when brute-force has to be used.
+        """
+        if self.store is None:
+            return None
+        state = self.store.get(src)
+        if not state or state['replays'] >= self.conf.get('brute_every', 10):
+            return None
+
+        neighbours = self.conf.get('neighbours', 2)
+        methods = [m for m in range(state['method'] - neighbours,
+                state['method'] + neighbours + 1)\
+                if 1 <= m <= self.brute_methods]
+        args = [x for x in self.args if x != self.brute_arg]
+        args += ['-m %i' % m for m in methods]
+        ret, _ = self.run_pngcrush(args, src, dest)
+        if ret != 0:
+            return None
+        if self.get_ratio(src, dest) > state['ratio'] *\
+                (1 + self.REGRESSION_TOLERANCE):
+            return None
+
+        state = dict(state, replays=state['replays'] + 1)
+        self.store.set(src, state)
+        return 0
+
+
+    def crush_brute(self, src, dest):
+        ret, method = self.run_pngcrush(self.args, src, dest)
+        if ret == 0 and self.store is not None:
+            if method:
+                self.store.set(src, {
+                    'method': method,
+                    'ratio': self.get_ratio(src, dest),
+                    'replays': 0,
+                })
+            else:
+                self.store.delete(src)
+        return ret
+
+
+    def get_ratio(self, src, dest):
+        return os.path.getsize(dest) / float(max(1, os.path.getsize(src)))
+
+
+    def run_pngcrush(self, args, src, dest):
+        """Returns exit code of pngcrush and the method it kept."""
+        # without -q pngcrush reports the best method, its output is only
+        # shown when it fails
+        args = [x for x in args if x != '-q']
         executable = self.env['%s_BIN' % tool_name.upper()]
-        return self.exec_command(
+        ret, output = self.exec_command_output(
             '{exe} {arg} {in_} {out}'.format(
             exe=executable,
-            arg=' '.join(self.args),
-            in_=self.file_in[0],
-            out=self.file_out[0],
+            arg=' '.join(args),
+            in_=src,
+            out=dest,
         ))
 
+        if ret != 0:
+            print(output)
+            return ret, None
+        match = self.BEST_METHOD_RE.search(output)
+        if match is None:
+            return ret, None
+        return ret, int(match.group(1))
+
 
 def configure(conf):
     conf.env['%s_BIN' % tool_name.upper()] = conf.find_program('pngcrush')[0]
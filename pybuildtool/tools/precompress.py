@@ -0,0 +1,164 @@
+"""
+Write gzip compressed copy next to every compressible file, for web servers
+serving precompressed assets (like nginx's gzip_static).
+
+All files are handled by one task, files not changed since the last build
+are skipped. The `.gz` files are outputs of the rule, the ones of files in
+the source tree are written at the same path inside the build directory.
+Files below `min_size` or above `max_ratio` get no `.gz`, other rules should
+not depend on it.
+
+Options:
+
+    * extensions : list, ['css', 'csv', 'eot', 'htm', 'html', 'ico', 'js',
+                   'json', 'map', 'md', 'otf', 'svg', 'ttf', 'txt', 'xml']
+                   File extensions to compress
+    * level      : int, 9
+                   Compression level [1-9]
+    * min_size   : int, 256
+                   Files smaller than this many bytes are not compressed
+    * max_ratio  : float, 0.9
+                   Compressed files larger than this ratio of the original
+                   are not kept
+    * workers    : int, None
+                   Number of files compressed at once, default is the number
+                   of processors
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+import os
+from pybuildtool import BaseTask, make_list
+from pybuildtool.core.rule import is_token_node
+from pybuildtool.misc.gzip_utils import gzip_compress
+from pybuildtool.misc.key_value_store import get_store
+
+tool_name = __name__
+
+class Task(BaseTask):
+
+    conf = {
+        '_source_grouped_': True,
+    }
+    name = tool_name
+
+    extensions = None
+    level = None
+    min_size = None
+    max_ratio = None
+    settings = None
+
+    def get_cpu_weight(self):
+        return self.get_parallel_weight(self.conf.get('workers'))
+
+
+    def declare_extra_out(self, file_in, file_out):
+        path = self.group.context.path.abspath()
+        return [self.get_gz_filename(os.path.join(path, f)) for f in file_in\
+                if self.is_compressible(f)]
+
+
+    def get_gz_filename(self, filename):
+        bld = self.group.context
+        bld_dir = os.path.join(bld.bldnode.abspath(), '')
+        src_dir = os.path.join(bld.srcnode.abspath(), '')
+        if not filename.startswith(bld_dir) and filename.startswith(src_dir):
+            # the source tree is left untouched
+            filename = os.path.join(bld_dir, filename[len(src_dir):])
+        return filename + '.gz'
+
+
+    def is_compressible(self, filename):
+        if self.extensions is None:
+            self.extensions = set('.' + x.lstrip('.') for x in make_list(
+                    self.conf.get('extensions', ['css', 'csv', 'eot', 'htm',
+                    'html', 'ico', 'js', 'json', 'map', 'md', 'otf', 'svg',
+                    'ttf', 'txt', 'xml'])))
+        return os.path.splitext(filename)[1].lower() in self.extensions
+
+
+    def prepare(self):
+        cfg = self.conf
+
+        self.level = cfg.get('level', 9)
+        self.min_size = cfg.get('min_size', 256)
+        self.max_ratio = cfg.get('max_ratio', 0.9)
+        # files compressed with other settings are compressed again
+        self.settings = [self.level, self.min_size, self.max_ratio]
+
+
+    def perform(self):
+        if len(self.file_out) != 0:
+            self.bld.fatal('%s writes files next to its input, it needs no '
+                    'output' % tool_name.capitalize())
+
+        store = get_store(self.bld, tool_name)
+        filenames = [f for f in self.file_in if self.is_compressible(f)]
+
+        # declared for every input, also the excluded ones
+        written = set()
+        declared = [self.get_gz_filename(node.abspath()) for node\
+                in self.inputs if not is_token_node(node) and\
+                not getattr(node, 'is_virtual_in_' + self._id, False) and\
+                self.is_compressible(node.abspath())]
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.cpu_tokens) as executor:
+            results = [(f, executor.submit(self._compress, f, store.get(f)))\
+                    for f in filenames]
+            for filename, future in results:
+                try:
+                    state = future.result()
+                except (IOError, OSError) as e:
+                    print('Failed to compress %s: %s' % (filename, e))
+                    failed += 1
+                    continue
+                store.set(filename, state)
+                if state[3]:
+                    written.add(self.get_gz_filename(filename))
+        self.absent_out = [f for f in declared if f not in written]
+
+        if failed:
+            return 1
+        return 0
+
+
+    def _compress(self, filename, state):
+        """Returns state of the file:
+        [size, mtime, hash, compressed, settings].
+        """
+        gz_filename = self.get_gz_filename(filename)
+        stat = os.stat(filename)
+        unchanged = state and state[4] == self.settings and\
+                (not state[3] or os.path.exists(gz_filename))
+
+        if unchanged and state[0] == stat.st_size and\
+                state[1] == stat.st_mtime:
+            return state
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+        digest = sha1(data).hexdigest()
+        if unchanged and state[2] == digest:
+            return [stat.st_size, stat.st_mtime, digest, state[3],
+                    self.settings]
+
+        compressed = None
+        if len(data) >= self.min_size:
+            compressed = gzip_compress(data, self.level)
+            if len(compressed) > self.max_ratio * len(data):
+                compressed = None
+
+        if compressed is None:
+            if os.path.exists(gz_filename):
+                os.remove(gz_filename)
+        else:
+            try:
+                os.makedirs(os.path.dirname(gz_filename))
+            except OSError:
+            #except FileExistsError:
+                pass
+            with open(gz_filename, 'wb') as f:
+                f.write(compressed)
+        return [stat.st_size, stat.st_mtime, digest, compressed is not None,
+                self.settings]
@@ -10,6 +10,18 @@ Options:
     * plugins          : list:str, [] ,   plugins to load (ex. pylint_django)
     * reporter         : str,      None,  custom reporter
     * full_report      : bool,     False, full report or only the messages
+    * workers          : int,      None,  number of pylint processes the
+                                          files are split across, default
+                                          is the number of processors
+
+Unless `reporter` or `full_report` is used, files are split across several
+pylint processes, messages of every file are remembered until the file or
+the configuration changes, and printed in the order of the files, as
+`path:line:column: message-id: message (symbol)`. With pylint 1.x, which
+does not report message ids in JSON, the symbol is printed in place of the
+id.
+Messages of a file also depend on the modules it imports, directly or not,
+a file is linted again when one of them changes.
 
 Requirements:
 
@@ -17,7 +29,22 @@ Requirements:
       to install, run `pip install pylint`
 
 """
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+import json
+import os
+try:
+    from html import unescape
+except ImportError:
+    # python 2
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
 from pybuildtool import BaseTask, expand_resource, make_list
+from pybuildtool.misc.file_utils import file_hash
+from pybuildtool.misc.import_graph import build_import_graph, find_imports,\
+        get_import_closure
+from pybuildtool.misc.key_value_store import get_store
+from pybuildtool.misc.lint_utils import LintCache
 
 tool_name = __name__
 
@@ -25,6 +52,28 @@ class Task(BaseTask):
 
     name = tool_name
     workdir = None
+    config_file = None
+
+    # pylint's exit code has a bit for every type of message
+    MESSAGE_STATUS = {
+        'fatal': 1,
+        'error': 2,
+        'warning': 4,
+        'refactor': 8,
+        'convention': 16,
+    }
+
+    def can_shard(self):
+        return not self.conf.get('reporter') and\
+                not self.conf.get('full_report')
+
+
+    def get_cpu_weight(self):
+        if not self.can_shard():
+            return super(Task, self).get_cpu_weight()
+        return self.get_parallel_weight(self.conf.get('workers'),
+                len(self.file_in))
+
 
     def prepare(self):
         cfg = self.conf
@@ -40,7 +89,8 @@ class Task(BaseTask):
         # Specify a configuration file
         c = cfg.get('config_file')
         if c:
-            args.append("--rcfile='%s'" % expand_resource(self.group, c))
+            self.config_file = expand_resource(self.group, c)
+            args.append("--rcfile='%s'" % self.config_file)
 
         # Set the output format. Available formats are text,
         # parseable, colorized, msvs (visual studio) and html.
@@ -79,9 +129,8 @@ class Task(BaseTask):
         if len(self.file_out) != 0:
             self.bld.fatal('%s produces no output' % tool_name.capitalize())
 
-        kwargs = {}
-        if self.workdir is not None:
-            kwargs['cwd'] = self.workdir
+        if self.can_shard():
+            return self.perform_shards()
 
         executable = self.env['%s_BIN' % tool_name.upper()]
         return self.exec_command(
@@ -90,7 +139,131 @@ class Task(BaseTask):
                 arg=' '.join(self.args),
                 in_=' '.join(self.file_in),
             ),
-            **kwargs)
+            **self.get_exec_kwargs())
+
+
+    def get_exec_kwargs(self):
+        kwargs = {}
+        if self.workdir is not None:
+            kwargs['cwd'] = self.workdir
+        return kwargs
+
+
+    def perform_shards(self):
+        config = [self.args, self.workdir]
+        if self.config_file:
+            config.append(file_hash(self.config_file))
+        cache = LintCache(self.bld, tool_name, config)
+
+        messages = {}
+        digests = self.get_signatures()
+        for filename in self.file_in:
+            _, messages[filename] = cache.get(filename, digests[filename])
+        lint = [f for f in self.file_in if messages[f] is None]
+
+        # messages about other files than the inputs
+        other_messages = []
+        status = 0
+        shards = min(self.cpu_tokens, len(lint))
+        with ThreadPoolExecutor(max_workers=max(1, shards)) as executor:
+            futures = [executor.submit(self.lint, lint[i::shards])\
+                    for i in range(shards)]
+            for future in futures:
+                shard_status, shard_messages = future.result()
+                if shard_messages is None:
+                    status |= shard_status
+                    continue
+                for filename, file_messages in shard_messages.items():
+                    if filename not in digests:
+                        other_messages += file_messages
+                        continue
+                    messages[filename] = file_messages
+                    cache.set(filename, digests[filename], file_messages)
+
+        for file_messages in [messages[f] for f in self.file_in] +\
+                [other_messages]:
+            if not file_messages:
+                continue
+            print('************* Module %s' % file_messages[0]['module'])
+            for m in file_messages:
+                print('%s:%s:%s: %s: %s (%s)' % (m['path'], m['line'],
+                        m['column'], m['message-id'], m['message'],
+                        m['symbol']))
+                status |= self.MESSAGE_STATUS.get(m['type'], 0)
+        return status
+
+
+    def get_signatures(self):
+        """Hash of every file together with the files it imports, directly
+        or not.
+        """
+        # imports of every file are remembered until the file changes
+        store = get_store(self.bld, tool_name + '-imports')
+        hashes = {}
+        imports = {}
+        for filename in self.file_in:
+            with open(filename, 'rb') as f:
+                source = f.read()
+            digest = sha1(source).hexdigest()
+            cached = store.get(filename)
+            if cached and cached[0] == digest:
+                names = cached[1]
+            else:
+                names = find_imports(filename, source)
+                store.set(filename, [digest, names])
+            hashes[filename] = digest
+            imports[filename] = names
+
+        graph = build_import_graph(imports)
+        signatures = {}
+        for filename in self.file_in:
+            digest = sha1(hashes[filename].encode('utf-8'))
+            for dep in sorted(get_import_closure(graph, filename)):
+                digest.update(('\0%s:%s' % (dep, hashes[dep])).encode(
+                        'utf-8'))
+            signatures[filename] = digest.hexdigest()
+        return signatures
+
+
+    def lint(self, filenames):
+        """Returns exit code of pylint and messages of every file, or None
+        when pylint failed.
+        """
+        executable = self.env['%s_BIN' % tool_name.upper()]
+        kwargs = self.get_exec_kwargs()
+        ret, output = self.exec_command_output(
+            '{exe} {arg} --output-format=json {in_}'.format(
+                exe=executable,
+                arg=' '.join(self.args),
+                in_=' '.join(filenames),
+            ),
+            stderr=False, **kwargs)
+
+        # fatal or usage error, the messages are not complete
+        if ret & (1 | 32):
+            print(output)
+            return ret, None
+        try:
+            result = json.loads(output or '[]')
+        except ValueError:
+            print(output)
+            return ret | 32, None
+
+        messages = dict((filename, []) for filename in filenames)
+        paths = dict((os.path.realpath(filename), filename) for filename\
+                in filenames)
+        cwd = kwargs.get('cwd') or os.getcwd()
+        for m in result:
+            # pylint 1.x has no message id, it and early 2.x escape the
+            # message as HTML
+            m['message-id'] = m.get('message-id') or m['symbol']
+            m['message'] = unescape(m['message'])
+            path = os.path.realpath(os.path.join(cwd, m['path']))
+            messages.setdefault(paths.get(path, path), []).append(m)
+        for file_messages in messages.values():
+            file_messages.sort(key=lambda m: (m['line'], m['column'],
+                    m['message-id']))
+        return ret, messages
 
 
 def configure(conf):
@@ -9,6 +9,11 @@ Options:
                          Ignore errors about unknown directives.
     * ignore_roles     : list, []
                          Ignore errors about unknown roles.
+    * workers          : int, None
+                         Number of files linted at once, default is the
+                         number of processors.
+
+Errors of every file are remembered until the file or the options change.
 
 Requirements:
 
@@ -21,6 +26,8 @@ Requirements:
 import os
 import re
 from pybuildtool import BaseTask, make_list
+from pybuildtool.misc.lint_utils import LintCache, lint_rst_file
+from pybuildtool.misc.process_utils import process_pool
 
 tool_name = __name__
 
@@ -31,6 +38,11 @@ class Task(BaseTask):
     encoding = None
     regex_ignores = None
 
+    def get_cpu_weight(self):
+        return self.get_parallel_weight(self.conf.get('workers'),
+                len(self.file_in))
+
+
     def prepare(self):
         cfg = self.conf
 
@@ -59,42 +71,56 @@ class Task(BaseTask):
 
 
     def perform(self):
-        from restructuredtext_lint import lint_file # pylint:disable=import-error
+        cache = LintCache(self.bld, tool_name, [self.encoding,
+                [x.pattern for x in self.regex_ignores]])
+
+        errors = {}
+        digests = {}
+        for filename in self.file_in:
+            digests[filename], errors[filename] = cache.get(filename)
+        lint = [f for f in self.file_in if errors[f] is None]
+
+        # docutils is python code, files are parsed in other processes to
+        # use more than one processor
+        if len(lint) > 1 and self.cpu_tokens > 1:
+            with process_pool(min(self.cpu_tokens, len(lint))) as executor:
+                results = list(executor.map(lint_rst_file, lint,
+                        [self.encoding] * len(lint)))
+        else:
+            results = [lint_rst_file(f, self.encoding) for f in lint]
+
+        for filename, file_errors in zip(lint, results):
+            errors[filename] = [error for error in file_errors\
+                    if not self.is_ignored(error[3])]
+            cache.set(filename, digests[filename], errors[filename])
 
         result = 0
         for filename in self.file_in:
-            errors = lint_file(filename, encoding=self.encoding)
-            if len(errors) == 0:
+            if len(errors[filename]) == 0:
                 continue
 
             relpath = os.path.relpath(filename)
             if relpath.startswith('.'):
                 relpath = filename
 
-            print_filename = True
-            for error in errors:
-                ignored = False
-                for re_ignore in self.regex_ignores:
-                    if re_ignore.match(error.message):
-                        ignored = True
-                        break
-
-                if ignored:
-                    continue
-
-                if print_filename:
-                    print('************* File ' + relpath)
-                    print_filename = False
-
-                if error.level > 2:
+            print('************* File ' + relpath)
+            for (error_type, level, line, message) in errors[filename]:
+                if level > 2:
                     result += 1
 
-                message = error.message.replace('\n', ' ')
-                print('%s: %i: %s' % (error.type[0], error.line, message))
+                message = message.replace('\n', ' ')
+                print('%s: %i: %s' % (error_type[0], line, message))
 
         return result
 
 
+    def is_ignored(self, message):
+        for re_ignore in self.regex_ignores:
+            if re_ignore.match(message):
+                return True
+        return False
+
+
 def configure(conf):
     conf.start_msg("Checking for python module '%s'" % tool_name)
     try:
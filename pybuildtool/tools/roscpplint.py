@@ -39,6 +39,16 @@ Options:
                     default value is 80 characters.
     * extensions  : list, ['c', 'cpp', 'h']
                     The allowed file extensions that cpplint will check.
+    * shard       : bool, True
+                    Split files into shards, each linted by its own cpplint
+                    process at once. Not done with `counting`, which counts
+                    errors of all files.
+    * workers     : int, None
+                    With `shard`, number of shards, default is the number of
+                    processors
+
+With `shard`, errors of every file are reported in the order of file_in, and
+results of every file are remembered until the file or the options change.
 
 Requirements:
 
@@ -48,6 +58,8 @@ Requirements:
 """
 import os
 from pybuildtool import BaseTask, expand_resource, make_list
+from pybuildtool.misc.lint_utils import LintCache, lint_shards,\
+        split_messages
 
 tool_name = __name__
 
@@ -56,6 +68,17 @@ class Task(BaseTask):
     name = tool_name
     workdir = None
 
+    def can_shard(self):
+        return self.conf.get('shard', True) and not self.conf.get('counting')
+
+
+    def get_cpu_weight(self):
+        if not self.can_shard():
+            return super(Task, self).get_cpu_weight()
+        return self.get_parallel_weight(self.conf.get('workers'),
+                len(self.file_in))
+
+
     def prepare(self):
         cfg = self.conf
         args = self.args
@@ -101,19 +124,51 @@ class Task(BaseTask):
         if len(self.file_out) != 0:
             self.bld.fatal("%s doesn't produce files" % tool_name.capitalize())
 
-        kwargs = {}
-        if self.workdir is not None:
-            kwargs['cwd'] = self.workdir
+        if self.can_shard():
+            return self.perform_shards()
+        return self.exec_command(self.get_command(self.file_in),
+                **self.get_exec_kwargs())
+
+
+    def perform_shards(self):
+        cache = LintCache(self.bld, tool_name, [self.args, self.workdir])
+        statuses, results, other_outputs = lint_shards(self, cache,
+                self.file_in, self.lint)
 
+        for _, messages in results:
+            for line in messages:
+                print(line)
+        for output in other_outputs:
+            print(output)
+
+        if any(statuses) or any(messages for (_, messages) in results):
+            return 1
+        return 0
+
+
+    def lint(self, filenames):
+        ret, output = self.exec_command_output(self.get_command(filenames),
+                **self.get_exec_kwargs())
+        messages, other = split_messages(filenames, output,
+                ignore=('Done processing ', 'Total errors found: '))
+        return ret, messages, '\n'.join(other)
+
+
+    def get_command(self, filenames):
         executable = self.env['%s_BIN' % tool_name.upper()]
         # TODO: roslint doesn't work in python3, xrange and bytes
-        return self.exec_command(
-            'python2 {exe} {arg} {in_}'.format(
-                exe=executable,
-                arg=' '.join(self.args),
-                in_=' '.join(self.file_in),
-            ),
-            **kwargs)
+        return 'python2 {exe} {arg} {in_}'.format(
+            exe=executable,
+            arg=' '.join(self.args),
+            in_=' '.join(filenames),
+        )
+
+
+    def get_exec_kwargs(self):
+        kwargs = {}
+        if self.workdir is not None:
+            kwargs['cwd'] = self.workdir
+        return kwargs
 
 
 def configure(conf):
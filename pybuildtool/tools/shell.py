@@ -24,6 +24,7 @@ class Task(BaseTask):
         '_source_grouped_': True,
     }
     name = tool_name
+    jobserver = True
     workdir = None
     cmd = None
     environ = None
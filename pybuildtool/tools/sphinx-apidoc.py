@@ -12,19 +12,29 @@ Options:
     * exclude     : list, []
                     Skip the documentation in this files
 
+The rst files are not written again, while the python modules of project_dir
+and the options stay the same, so sphinx-build does not read them again.
+
 Requirements:
 
     * sphinx
       to install, run `pip install sphinx`
 
 """
+import os
 from pybuildtool import BaseTask, expand_resource, expand_wildcard, make_list
+from pybuildtool.misc.key_value_store import get_store
 
 tool_name = __name__
 
 class Task(BaseTask):
 
+    PY_SUFFIXES = ('.py', '.pyx')
+
     name = tool_name
+    exclude = None
+    output_dir = None
+    project_dir = None
     workdir = None
 
     def prepare(self):
@@ -39,21 +49,38 @@ class Task(BaseTask):
             if self.workdir is None:
                 self.bld.fatal(cfg['work_dir'] + ' not found.')
 
-        output_dir = expand_resource(self.group, cfg['output_dir'])
-        if output_dir is None:
+        self.output_dir = expand_resource(self.group, cfg['output_dir'])
+        if self.output_dir is None:
             self.bld.fatal(cfg['output_dir'] + ' not found.')
-        args.append('-o ' + output_dir)
+        args.append('-o ' + self.output_dir)
 
-        project_dir = expand_resource(self.group, cfg['project_dir'])
-        if project_dir is None:
+        self.project_dir = expand_resource(self.group, cfg['project_dir'])
+        if self.project_dir is None:
             self.bld.fatal(cfg['project_dir'] + ' not found.')
-        args.append(project_dir)
+        args.append(self.project_dir)
 
+        self.exclude = []
         for fname in make_list(cfg.get('exclude')):
             exclude_files = expand_wildcard(self.group, fname)
             if exclude_files is None:
                 self.bld.fatal(fname + ' not found.')
-            args.extend(exclude_files)
+            self.exclude.extend(exclude_files)
+        args.extend(self.exclude)
+
+
+    def get_modules(self):
+        """Python modules of project_dir documented by sphinx-apidoc."""
+        exclude = set(os.path.normpath(f) for f in self.exclude)
+        modules = []
+        for dirpath, dirnames, filenames in os.walk(self.project_dir):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.')\
+                    and os.path.join(dirpath, d) not in exclude)
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(self.PY_SUFFIXES) and\
+                        path not in exclude:
+                    modules.append(os.path.relpath(path, self.project_dir))
+        return modules
 
 
     def perform(self):
@@ -62,18 +89,29 @@ class Task(BaseTask):
         if len(self.file_out) != 0:
             self.bld.fatal('%s produces no output' % tool_name.capitalize())
 
+        # the rst files only list the modules, they change when modules are
+        # added or removed
+        store = get_store(self.bld, tool_name)
+        state = {'args': self.args, 'modules': self.get_modules()}
+        if store.get(self.get_rule_name()) == state and\
+                os.listdir(self.output_dir):
+            return 0
+
         kwargs = {}
         if self.workdir is not None:
             kwargs['cwd'] = self.workdir
 
         executable = self.env['SPHINX_APIDOC_BIN']
-        return self.exec_command(
+        ret = self.exec_command(
             '{exe} {arg} {in_}'.format(
                 exe=executable,
                 arg=' '.join(self.args),
                 in_=' '.join(self.file_in),
             ),
             **kwargs)
+        if ret == 0:
+            store.set(self.get_rule_name(), state)
+        return ret
 
 
 def configure(conf):
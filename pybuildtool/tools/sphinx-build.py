@@ -7,15 +7,22 @@ facilities for the documentation of sofware projects in a range of languages.
 
 Options:
 
-    * builder    : str, html
-                   Builder to use; default is html.
+    * builder    : list, html
+                   Builders to use; default is html. Builders after the first
+                   one reuse the environment and doctree files it wrote.
     * source_dir : str, None, required
                    Source directory.
     * output_dir : str, None, required
-                   Output directory.
+                   Output directory. With more than one builder, every
+                   builder writes into a directory named after it inside
+                   output_dir.
     * temp_dir   : str, None
                    Path for the cached environment and doctree files
-                   (default: output_dir/.doctrees)
+                   (default: a directory of the rule inside the variant's
+                   build directory, created when missing)
+    * persistent : bool, True
+                   Keep temp_dir when running `waf clean`, if it is inside
+                   the build directory.
     * conf_dir   : str, None
                    Path where configuration file (conf.py) is located
                    (default: same as sourcedir).
@@ -25,6 +32,8 @@ Options:
                    Pass a value into HTML templates.
     * jobs       : int, None
                    Build in parallel with N processes where possible.
+                   Limited by the cpu budget of the build (waf's `-j`), by
+                   default all cpu granted to the task.
 
 Requirements:
 
@@ -32,15 +41,38 @@ Requirements:
       to install, run `pip install sphinx`
 
 """
-from pybuildtool import BaseTask, expand_resource
+import os
+from pybuildtool import BaseTask, expand_resource, make_list
 
 tool_name = __name__
 
 class Task(BaseTask):
 
     name = tool_name
+    memory_estimate = 512
+    builders = None
+    output_dir = None
+    source_dir = None
     workdir = None
 
+    def get_temp_dir(self):
+        c = self.conf.get('temp_dir')
+        if c:
+            return expand_resource(self.group, c)
+        return self.get_state_dir(tool_name)
+
+
+    def declare_persistent_dirs(self):
+        temp_dir = self.get_temp_dir()
+        if temp_dir and self.conf.get('persistent', True):
+            return [temp_dir]
+        return []
+
+
+    def get_cpu_weight(self):
+        return self.get_parallel_weight(self.conf.get('jobs'))
+
+
     def prepare(self):
         cfg = self.conf
         args = self.args
@@ -51,22 +83,22 @@ class Task(BaseTask):
             if self.workdir is None:
                 self.bld.fatal(cfg['work_dir'] + ' not found.')
 
-        source_dir = expand_resource(self.group, cfg['source_dir'])
-        if source_dir is None:
+        self.source_dir = expand_resource(self.group, cfg['source_dir'])
+        if self.source_dir is None:
             self.bld.fatal(cfg['source_dir'] + ' not found.')
-        args.append(source_dir)
 
-        output_dir = expand_resource(self.group, cfg['output_dir'])
-        if output_dir is None:
+        self.output_dir = expand_resource(self.group, cfg['output_dir'])
+        if self.output_dir is None:
             self.bld.fatal(cfg['output_dir'] + ' not found.')
-        args.append(output_dir)
 
-        c = cfg.get('temp_dir')
-        if c:
-            temp_dir = expand_resource(self.group, c)
-            if temp_dir is None:
-                self.bld.fatal(c + ' not found.')
-            args.append('-d ' + temp_dir)
+        # environment and doctrees are kept between builds and shared by
+        # every builder, only changed sources are read again
+        temp_dir = self.get_temp_dir()
+        if temp_dir is None:
+            self.bld.fatal(cfg['temp_dir'] + ' not found.')
+        if not os.path.isdir(temp_dir):
+            os.makedirs(temp_dir)
+        args.append('-d ' + temp_dir)
 
         c = cfg.get('conf_dir')
         if c:
@@ -75,12 +107,12 @@ class Task(BaseTask):
                 self.bld.fatal(c + ' not found.')
             args.append('-c ' + conf_dir)
 
-        c = cfg.get('builder', 'html')
-        args.append('-b ' + c)
+        self.builders = make_list(cfg.get('builder', 'html'))
+        if len(self.builders) == 0:
+            self.bld.fatal('%s needs a builder' % tool_name.capitalize())
 
-        c = cfg.get('jobs')
-        if c:
-            args.append('-j %i' % c)
+        if self.cpu_tokens > 1:
+            args.append('-j %i' % self.cpu_tokens)
 
         c = cfg.get('settings', {})
         for key, value in c.items():
@@ -100,13 +132,24 @@ class Task(BaseTask):
             kwargs['cwd'] = self.workdir
 
         executable = self.env['SPHINX_BUILD_BIN']
-        return self.exec_command(
-            '{exe} {arg} {in_}'.format(
-                exe=executable,
-                arg=' '.join(self.args),
-                in_=' '.join(self.file_in),
-            ),
-            **kwargs)
+        # one after another, builders share the environment
+        for builder in self.builders:
+            output_dir = self.output_dir
+            if len(self.builders) > 1:
+                output_dir = os.path.join(output_dir, builder)
+            ret = self.exec_command(
+                '{exe} -b {builder} {arg} {src} {out} {in_}'.format(
+                    exe=executable,
+                    builder=builder,
+                    arg=' '.join(self.args),
+                    src=self.source_dir,
+                    out=output_dir,
+                    in_=' '.join(self.file_in),
+                ),
+                **kwargs)
+            if ret:
+                return ret
+        return 0
 
 
 def configure(conf):
@@ -8,6 +8,14 @@ Options:
 
     * work_dir : str, None, Change current directory
     * flags    : list, [], enable or disable checks
+    * shard    : bool, False, split files into shards, each linted by its
+                 own splint process at once, checks across files of
+                 different shards are not done
+    * workers  : int, None, with `shard`, number of shards, default is the
+                 number of processors
+
+With `shard`, errors of every file are reported in the order of file_in, and
+results of every file are remembered until the file or the options change.
 
 Requirements:
 
@@ -16,6 +24,8 @@ Requirements:
 
 """
 from pybuildtool import BaseTask, expand_resource, make_list
+from pybuildtool.misc.lint_utils import LintCache, lint_shards,\
+        split_messages
 
 tool_name = __name__
 
@@ -24,6 +34,13 @@ class Task(BaseTask):
     name = tool_name
     workdir = None
 
+    def get_cpu_weight(self):
+        if not self.conf.get('shard'):
+            return super(Task, self).get_cpu_weight()
+        return self.get_parallel_weight(self.conf.get('workers'),
+                len(self.file_in))
+
+
     def prepare(self):
         cfg = self.conf
         args = self.args
@@ -56,18 +73,50 @@ class Task(BaseTask):
         if len(self.file_out) != 0:
             self.bld.fatal('%s produces no output' % tool_name.capitalize())
 
+        if self.conf.get('shard'):
+            return self.perform_shards()
+        return self.exec_command(self.get_command(self.file_in),
+                **self.get_exec_kwargs())
+
+
+    def perform_shards(self):
+        cache = LintCache(self.bld, tool_name, [self.args, self.workdir])
+        statuses, results, other_outputs = lint_shards(self, cache,
+                self.file_in, self.lint)
+
+        for _, messages in results:
+            for line in messages:
+                print(line)
+        for output in other_outputs:
+            print(output)
+
+        if any(statuses) or any(messages for (_, messages) in results):
+            return 1
+        return 0
+
+
+    def lint(self, filenames):
+        ret, output = self.exec_command_output(self.get_command(filenames),
+                **self.get_exec_kwargs())
+        messages, other = split_messages(filenames, output,
+                ignore=('Splint ', 'Finished checking '))
+        return ret, messages, '\n'.join(other)
+
+
+    def get_command(self, filenames):
+        executable = self.env['%s_BIN' % tool_name.upper()]
+        return '{exe} {arg} {in_}'.format(
+            exe=executable,
+            arg=' '.join(self.args),
+            in_=' '.join(filenames),
+        )
+
+
+    def get_exec_kwargs(self):
         kwargs = {}
         if self.workdir is not None:
             kwargs['cwd'] = self.workdir
-
-        executable = self.env['%s_BIN' % tool_name.upper()]
-        return self.exec_command(
-            '{exe} {arg} {in_}'.format(
-                exe=executable,
-                arg=' '.join(self.args),
-                in_=' '.join(self.file_in),
-            ),
-            **kwargs)
+        return kwargs
 
 
 def configure(conf):
@@ -0,0 +1,123 @@
+"""
+Convert TrueType/OpenType fonts to WOFF and EOT formats in process, every
+font is read once for all of the formats.
+
+Options:
+
+    * formats : list, ['woff', 'eot']
+                Formats written, the extension of file_out must be one of
+                them, the others are written next to it with their own
+                extension
+    * level   : int, 9
+                WOFF compression level [1-9]
+    * workers : int, None
+                Used with `_source_tree_`, number of fonts converted at once,
+                default is the number of processors
+
+A directory rule with `_source_tree_` option converts every font in one task.
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pybuildtool import BaseTask, make_list
+from pybuildtool.misc.font_utils import FontError, read_sfnt, sfnt_to_eot,\
+        sfnt_to_woff
+
+tool_name = __name__
+
+class Task(BaseTask):
+
+    conf = {
+        'replace_patterns': ((r'\.ttf$', '.woff'), (r'\.otf$', '.woff'))
+    }
+    name = tool_name
+
+    FORMATS = ('woff', 'eot')
+
+    formats = None
+    level = None
+
+    def get_formats(self):
+        formats = make_list(self.conf.get('formats', list(self.FORMATS)))
+        for fmt in formats:
+            if fmt not in self.FORMATS:
+                self.group.context.fatal('%s "formats" option must be any '
+                        'of: %s' % (tool_name.capitalize(),
+                        ', '.join(self.FORMATS)))
+        return formats
+
+
+    def get_outputs(self, file_out):
+        """Files of every format for the font converted into `file_out`."""
+        basename, ext = os.path.splitext(file_out)
+        if ext[1:] not in self.formats:
+            self.group.context.fatal('%s cannot write "%s", the extension '
+                    'is not one of "formats"' % (tool_name.capitalize(),
+                    file_out))
+        return [(fmt, basename + '.' + fmt) for fmt in self.formats]
+
+
+    def declare_extra_out(self, file_in, file_out):
+        self.formats = self.get_formats()
+        return [path for fo in file_out for (_, path) in\
+                self.get_outputs(fo) if path != fo]
+
+
+    def get_cpu_weight(self):
+        if self.conf.get('_source_tree_'):
+            return self.get_parallel_weight(self.conf.get('workers'))
+        return super(Task, self).get_cpu_weight()
+
+
+    def prepare(self):
+        self.formats = self.get_formats()
+        self.level = self.conf.get('level', 9)
+
+
+    def perform(self):
+        if self.conf.get('_source_tree_'):
+            file_map = self.file_map
+        else:
+            if len(self.file_in) != 1:
+                self.bld.fatal('%s only need one input' %\
+                        tool_name.capitalize())
+            if len(self.file_out) != 1:
+                self.bld.fatal('%s only have one output' %\
+                        tool_name.capitalize())
+            file_map = [(self.file_in[0], self.file_out[0])]
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.cpu_tokens) as executor:
+            results = [(src, executor.submit(self.convert, src, dest))\
+                    for (src, dest) in file_map]
+            for src, future in results:
+                try:
+                    future.result()
+                except (IOError, OSError, FontError) as e:
+                    print('Failed to convert %s: %s' % (src, e))
+                    failed += 1
+
+        if failed:
+            return 1
+        return 0
+
+
+    def convert(self, src, dest):
+        with open(src, 'rb') as f:
+            sfnt = read_sfnt(f.read())
+
+        dest_dir = os.path.dirname(dest)
+        if not os.path.isdir(dest_dir):
+            try:
+                os.makedirs(dest_dir)
+            except OSError:
+                # created by other thread
+                pass
+
+        for (fmt, path) in self.get_outputs(dest):
+            if fmt == 'woff':
+                data = sfnt_to_woff(sfnt, self.level)
+            else:
+                data = sfnt_to_eot(sfnt)
+            with open(path, 'wb') as f:
+                f.write(data)
@@ -6,41 +6,73 @@ Options:
     * extract_dir  : str, None,  destination directory (required)
     * quiet        : bool, False, quiet mode
 
-Requirements:
-
-    * unzip
-      to install, for example run `apt-get install unzip`
+Files of the archive are declared as outputs of the rule, when the archive
+exists before the build, so rules using them are only run again when the
+files they use change. Only files which CRC changed since the last
+extraction are written again, files removed from the archive are deleted.
 
 """
 
 import os
-from pybuildtool import BaseTask, expand_resource
+from shutil import copyfileobj
+from time import mktime
+import zipfile
+from pybuildtool import BaseTask
+from pybuildtool.misc.key_value_store import get_store
 
 tool_name = __name__
 
+def is_directory(info):
+    return info.filename.endswith('/')
+
+
 class Task(BaseTask):
 
     name = tool_name
+    extract_dir = None
 
-    def prepare(self):
-        # Update files, create if necessary
-        self.args = ['-uo']
-
+    def get_extract_dir(self):
         c = self.conf.get('extract_dir')
         if c is None:
+            return None
+        path = c.format(**self.group.get_patterns())
+        return os.path.normpath(os.path.join(
+                self.group.context.path.abspath(), path))
+
+
+    def declare_extra_out(self, file_in, file_out):
+        extract_dir = self.get_extract_dir()
+        if extract_dir is None or len(file_in) != 1:
+            return []
+
+        archive = os.path.join(self.group.context.path.abspath(), file_in[0])
+        if not os.path.isfile(archive):
+            # produced by other rule
+            return []
+        with zipfile.ZipFile(archive) as zf:
+            return [self.get_member_path(extract_dir, info)\
+                    for info in zf.infolist() if not is_directory(info)]
+
+
+    def get_member_path(self, extract_dir, info):
+        path = os.path.normpath(os.path.join(extract_dir, info.filename))
+        if not path.startswith(os.path.join(extract_dir, '')):
+            self.group.context.fatal('%s refuses to extract "%s" outside of '
+                    '"extract_dir"' % (tool_name.capitalize(), info.filename))
+        return path
+
+
+    def prepare(self):
+        self.extract_dir = self.get_extract_dir()
+        if self.extract_dir is None:
             self.bld.fatal('"extract_dir" configuration is required')
 
-        path = c.format(**self.group.get_patterns())
+        path = self.extract_dir
         if not os.path.exists(path):
             os.makedirs(path)
         elif not os.path.isdir(path):
             os.remove(path)
             os.makedirs(path)
-        self.args.append('-d ' + expand_resource(self.group, c))
-
-        c = self.conf.get('quiet')
-        if c:
-            self.args.append('-q')
 
 
     def perform(self):
@@ -49,15 +81,55 @@ class Task(BaseTask):
         if len(self.file_out) != 0:
             self.bld.fatal('%s does not need output' % tool_name.capitalize())
 
-        executable = self.env['%s_BIN' % tool_name.upper()]
-        return self.exec_command(
-            '{exe} {arg} {in_}'.format(
-            exe=executable,
-            arg=' '.join(self.args),
-            in_=self.file_in[0],
-        ))
-
-
-def configure(conf):
-    bin_path = conf.find_program('unzip')[0]
-    conf.env['%s_BIN' % tool_name.upper()] = bin_path
+        # manifest of the last extraction, path of every file and its CRC
+        store = get_store(self.bld, tool_name)
+        manifest_key = '%s:%s' % (self.file_in[0], self.extract_dir)
+        old_manifest = store.get(manifest_key, {})
+        manifest = {}
+        quiet = self.conf.get('quiet')
+
+        try:
+            with zipfile.ZipFile(self.file_in[0]) as zf:
+                for info in zf.infolist():
+                    path = self.get_member_path(self.extract_dir, info)
+                    if is_directory(info):
+                        if not os.path.isdir(path):
+                            os.makedirs(path)
+                        continue
+
+                    manifest[path] = info.CRC
+                    if old_manifest.get(path) == info.CRC and\
+                            os.path.isfile(path) and\
+                            os.path.getsize(path) == info.file_size:
+                        continue
+                    if not quiet:
+                        print('  inflating: %s' % path)
+                    self.extract_member(zf, info, path)
+        except (IOError, OSError, zipfile.BadZipfile) as e:
+            print('Failed to extract %s: %s' % (self.file_in[0], e))
+            return 1
+
+        for path in old_manifest:
+            if path not in manifest and os.path.isfile(path):
+                os.remove(path)
+        store.set(manifest_key, manifest)
+        return 0
+
+
+    def extract_member(self, zf, info, path):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        # readers never see a partially written file
+        temp_path = path + '.unzip-tmp'
+        with zf.open(info) as src, open(temp_path, 'wb') as dest:
+            copyfileobj(src, dest, 1024 * 1024)
+        getattr(os, 'replace', os.rename)(temp_path, path)
+
+        # like unzip, restore permissions and modification time
+        mode = info.external_attr >> 16
+        if mode:
+            os.chmod(path, mode & 0o7777)
+        mtime = mktime(info.date_time + (0, 0, -1))
+        os.utime(path, (mtime, mtime))
@@ -213,7 +213,10 @@ tool_name = __name__
 class Task(BaseTask):
 
     name = tool_name
+    memory_estimate = 1024
     workdir = None
+    # loaders and minifiers run in worker processes
+    cpu_weight = 2
 
     def prepare(self):
         cfg = self.conf